@@ -90,7 +90,10 @@ def set_properties(project):
                                                       "symlink", "postinstall"])
 
     project.set_property("distutils_entry_points", {
-        "distutils.commands": ["bdist_axle = wheel_axle.bdist_axle:BdistAxle"]
+        "distutils.commands": ["bdist_axle = wheel_axle.bdist_axle:BdistAxle",
+                               "sdist_axle = wheel_axle.sdist_axle:SdistAxle",
+                               "verify_axle = wheel_axle.verify_axle:VerifyAxle",
+                               "repack_axle = wheel_axle.repack_axle:RepackAxle"]
     })
 
     project.set_property("distutils_classifiers", [
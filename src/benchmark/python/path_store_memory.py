@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Reports the peak RSS of the staged path bookkeeping of an axle against its file count.
+
+Every measurement runs in a fresh interpreter and mimics a build staging `count` files, a tenth of them symlinks,
+spread over directories of 100 entries: the outfiles, the per-command symlinks, their merge in `install` and
+the relative symlinks written by `egg2dist`. Plain lists of strings and tuples are compared to the `PathStore`.
+
+With `--build` actual `bdist_axle` builds of a generated project shipping `count` data files, laid out the same way,
+are measured instead, reporting the peak RSS and the duration of the whole build.
+
+    PYTHONPATH=src/main/python python src/benchmark/python/path_store_memory.py [--build] [count ...]
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import time
+from tempfile import TemporaryDirectory
+
+BASE = "/tmp/build/bdist.linux-x86_64/wheel/package_name/subpackage_%d/resources_%d"
+DEFAULT_COUNTS = [10_000, 100_000, 1_000_000]
+DEFAULT_BUILD_COUNTS = [1_000, 10_000, 100_000]
+
+SETUP_PY = """\
+import os
+from setuptools import setup
+
+import wheel_axle.bdist_axle
+
+data_files = []
+for root, _, files in sorted(os.walk("data")):
+    if files:
+        data_files.append((os.path.join("share", "bench", root), [os.path.join(root, f) for f in sorted(files)]))
+
+setup(name="bench", version="0.0.1", data_files=data_files,
+      cmdclass={"bdist_axle": wheel_axle.bdist_axle.BdistAxle})
+"""
+
+
+def staged_paths(count):
+    for i in range(count):
+        path = os.path.join(BASE % (i // 10_000, i // 100), "data_file_%d.bin" % i)
+        if i % 10 == 0:
+            yield path, ("data_file_%d.bin" % (i - 1), False)
+        else:
+            yield path, None
+
+
+def stage_lists(count):
+    outfiles = []
+    symlinks = []
+    for path, link in staged_paths(count):
+        if link:
+            symlinks.append((path,) + link)
+        outfiles.append(path)
+    merged = []
+    seen = set()
+    for symlink in symlinks:
+        if symlink not in seen:
+            seen.add(symlink)
+            merged.append(symlink)
+    relative = [(os.path.relpath(s[0], "/tmp/build"), s[1], s[2]) for s in merged]
+    return outfiles, symlinks, merged, relative
+
+
+def stage_store(count):
+    from wheel_axle.bdist_axle._path_store import PathList, PathStore, SymlinkList
+
+    store = PathStore()
+    outfiles = PathList(store)
+    symlinks = SymlinkList(store)
+    for path, link in staged_paths(count):
+        if link:
+            symlinks.append((path,) + link)
+        outfiles.append(path)
+    merged = SymlinkList(store)
+    merged.merge(symlinks)
+    relative = merged.relative_to("/tmp/build")
+    for _ in relative:
+        pass
+    return outfiles, symlinks, merged
+
+
+def generate_project(project_dir, count):
+    with open(os.path.join(project_dir, "setup.py"), "w") as f:
+        f.write(SETUP_PY)
+    for i in range(count):
+        dir_name = os.path.join(project_dir, "data", "resources_%d" % (i // 100))
+        if i % 100 == 0:
+            os.makedirs(dir_name)
+        path = os.path.join(dir_name, "data_file_%d.bin" % i)
+        if i % 10 == 0 and i % 100:
+            os.symlink("data_file_%d.bin" % (i - 1), path)
+        else:
+            with open(path, "wb") as f:
+                f.write(b"%d\n" % i)
+
+
+def measure_build(count):
+    with TemporaryDirectory(prefix="path_store_memory") as project_dir:
+        generate_project(project_dir, count)
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "setup.py", "-q", "bdist_axle", "--dist-dir", "dist"],
+                       cwd=project_dir, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        duration = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss, duration)
+
+
+def measure(mode, count):
+    if mode == "store":
+        # exclude the imports of the package from the measurement
+        import wheel_axle.bdist_axle._path_store  # noqa: F401
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = (stage_lists if mode == "lists" else stage_store)(count)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    assert len(result[0]) == count
+    # ru_maxrss is in KiB on Linux
+    print(peak - baseline)
+
+
+def main_build(counts):
+    print("%12s %16s %16s" % ("files", "build (MiB)", "build (s)"))
+    for count in counts:
+        output = subprocess.run([sys.executable, __file__, "--measure-build", str(count)],
+                                check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        peak, duration = output.split()
+        print("%12d %16.1f %16.1f" % (count, int(peak) / 1024, float(duration)))
+
+
+def main(counts):
+    print("%12s %16s %16s" % ("files", "lists (MiB)", "store (MiB)"))
+    for count in counts:
+        row = []
+        for mode in ("lists", "store"):
+            output = subprocess.run([sys.executable, __file__, "--measure", mode, str(count)],
+                                    check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+            row.append(int(output) / 1024)
+        print("%12d %16.1f %16.1f" % (count, *row))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], int(sys.argv[3]))
+    elif len(sys.argv) == 3 and sys.argv[1] == "--measure-build":
+        measure_build(int(sys.argv[2]))
+    elif sys.argv[1:2] == ["--build"]:
+        main_build([int(arg) for arg in sys.argv[2:]] or DEFAULT_BUILD_COUNTS)
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or DEFAULT_COUNTS)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Reports what the `.pth` file of an installed axle costs every interpreter start.
+
+Every measurement runs in a fresh interpreter with `-X importtime`, processing a site dir holding a single axle with
+`site.addsitedir`. The `.pth` line that imports the runtime unconditionally and the one checking the lock only are
+compared to the current `BdistAxle.AXLE_PTH_CONTENTS` for distributions that have nothing left to do: finalized with the
+`.pth` left behind, removed with the `.pth` left behind and, unless run as root, installed into a read-only site dir.
+The median time spent in `addsitedir` and in the imports it triggers over `runs` runs is reported along with the number
+of modules imported.
+
+    PYTHONPATH=src/main/python python src/benchmark/python/pth_startup_time.py [runs]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+
+DEFAULT_RUNS = 20
+DIST_NAME = "bench-0.0.1"
+
+BEFORE_PTH_CONTENTS = "import wheel_axle.runtime; wheel_axle.runtime.finalize(fullname);"
+LOCK_ONLY_PTH_CONTENTS = ("import os; os.access(os.path.join(fullname[:-4] + '.dist-info', 'axle.lck'), os.W_OK) and "
+                          "__import__('wheel_axle.runtime').runtime.finalize(fullname);")
+
+MEASURE = """\
+import site, sys, time
+sys.stderr.write("addsitedir\\n")
+sys.stderr.flush()
+start = time.perf_counter()
+site.addsitedir(sys.argv[1])
+print(time.perf_counter() - start)
+"""
+
+
+def make_site_dir(site_dir, pth_contents, state):
+    dist_info_dir = os.path.join(site_dir, DIST_NAME + ".dist-info")
+    with open(os.path.join(site_dir, DIST_NAME + ".pth"), "w") as f:
+        f.write(pth_contents + "\n")
+    if state == "removed":
+        return
+
+    from wheel_axle.runtime.constants import AXLE_DONE_FILE, AXLE_LOCK_FILE
+
+    os.mkdir(dist_info_dir)
+    with open(os.path.join(dist_info_dir, AXLE_LOCK_FILE), "wb"):
+        pass
+    if state == "finalized":
+        with open(os.path.join(dist_info_dir, AXLE_DONE_FILE), "wb"):
+            pass
+    elif state == "read-only":
+        os.chmod(os.path.join(dist_info_dir, AXLE_LOCK_FILE), 0o444)
+        os.chmod(dist_info_dir, 0o555)
+        os.chmod(site_dir, 0o555)
+
+
+def measure(site_dir):
+    """Returns the time spent in `addsitedir`, the time spent importing meanwhile and the number of modules imported"""
+    result = subprocess.run([sys.executable, "-S", "-X", "importtime", "-c", MEASURE, site_dir],
+                            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+                            check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    imports = result.stderr.split("addsitedir\n", 1)[1]
+    self_times = [int(line.split("|")[0].split(":")[1]) for line in imports.splitlines()
+                  if line.startswith("import time:") and line.split("|")[0].split(":")[1].strip().isdigit()]
+    return float(result.stdout) * 1e6, sum(self_times), len(self_times)
+
+
+def main(runs):
+    from wheel_axle.bdist_axle import BdistAxle
+
+    states = ["finalized", "removed"]
+    if os.geteuid() != 0:
+        states.append("read-only")
+
+    stubs = (("before", BEFORE_PTH_CONTENTS), ("lock only", LOCK_ONLY_PTH_CONTENTS),
+             ("after", BdistAxle.AXLE_PTH_CONTENTS))
+    print("%12s %10s %18s %16s %10s" % ("state", "stub", "addsitedir (us)", "imports (us)", "modules"))
+    for state in states:
+        for stub, pth_contents in stubs:
+            with TemporaryDirectory(prefix="pth_startup_time") as tmp_dir:
+                site_dir = os.path.join(tmp_dir, "site")
+                os.mkdir(site_dir)
+                make_site_dir(site_dir, pth_contents, state)
+                try:
+                    results = [measure(site_dir) for _ in range(runs)]
+                finally:
+                    for root, dirs, _ in os.walk(tmp_dir):
+                        for name in dirs:
+                            os.chmod(os.path.join(root, name), 0o755)
+            print("%12s %10s %18.0f %16.0f %10d" % (state, stub,
+                                                    statistics.median(result[0] for result in results),
+                                                    statistics.median(result[1] for result in results),
+                                                    statistics.median(result[2] for result in results)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RUNS)
@@ -16,13 +16,24 @@
 #
 
 import csv
+import hashlib
+import json
+import logging
+import marshal
 import os
 import runpy
 import shutil
+import signal
+import struct
 import sys
+import tarfile
+import threading
+import time
 import unittest
-from os.path import dirname, join as jp, exists
-from subprocess import check_call
+import zipfile
+from glob import glob
+from os.path import dirname, join as jp, exists, getsize, islink
+from subprocess import check_call, run, Popen, PIPE, STDOUT
 from tempfile import TemporaryDirectory
 
 try:
@@ -66,19 +77,32 @@ class BuildAxleTest(unittest.TestCase):
             except Exception:
                 sys.excepthook(*sys.exc_info())
 
-    def build_axle(self, dir_name, *extra_args):
-        src_dir = jp(self.test_dir, dir_name)
-        shutil.copytree(src_dir, self.src_dir, symlinks=True, ignore_dangling_symlinks=True)
+    def copy_src(self, dir_name):
+        if not exists(self.src_dir):
+            src_dir = jp(self.test_dir, dir_name)
+            shutil.copytree(src_dir, self.src_dir, symlinks=True, ignore_dangling_symlinks=True)
+
+    def compile_shared_lib(self, lib_path, soname, *extra_args):
+        c_file = lib_path + ".c"
+        with open(c_file, "w") as f:
+            f.write("int foo(int x) { return x * 2; }\n")
+        try:
+            os.unlink(lib_path)
+        except FileNotFoundError:
+            pass
+        check_call(["gcc", "-g", "-shared", "-fPIC", "-o", lib_path, f"-Wl,-soname,{soname}", c_file] +
+                   list(extra_args))
+        os.unlink(c_file)
+
+    def run_setup(self, dir_name, *args):
+        self.copy_src(dir_name)
 
         old_sys_argv = list(sys.argv)
         old_cwd = os.getcwd()
         try:
             script_path = jp(self.src_dir, "setup.py")
             sys.argv.clear()
-            sys.argv.extend([script_path, "bdist_axle",
-                             "-k",
-                             "--bdist-dir", self.build_dir,
-                             "--dist-dir", self.dist_dir] + list(extra_args))
+            sys.argv.extend([script_path] + list(args))
             os.chdir(self.src_dir)
             runpy.run_path(script_path)
         finally:
@@ -86,7 +110,34 @@ class BuildAxleTest(unittest.TestCase):
             sys.argv.clear()
             sys.argv.extend(old_sys_argv)
 
-        check_call(["twine", "check", "--strict", f"{self.dist_dir}/*.whl"])
+    def build_axle(self, dir_name, *extra_args):
+        self.run_setup(dir_name, "bdist_axle",
+                       "-k",
+                       "--bdist-dir", self.build_dir,
+                       "--dist-dir", self.dist_dir, *extra_args)
+
+        if glob(jp(self.dist_dir, "*.whl")):
+            check_call(["twine", "check", "--strict", f"{self.dist_dir}/*.whl"])
+
+    def build_axle_with_hook(self, dir_name, hook, build_dir=None, dist_dir=None, **options):
+        """Builds the axle with `hook` registered for the build events and the `bdist_axle` attributes in `options`"""
+        from distutils.core import run_setup
+
+        self.copy_src(dir_name)
+        old_cwd = os.getcwd()
+        try:
+            os.chdir(self.src_dir)
+            dist = run_setup(jp(self.src_dir, "setup.py"), stop_after="init")
+            cmd = dist.get_command_obj("bdist_axle")
+            cmd.bdist_dir = build_dir or self.build_dir
+            cmd.dist_dir = dist_dir or self.dist_dir
+            cmd.keep_temp = True
+            for option, value in options.items():
+                setattr(cmd, option, value)
+            cmd.add_event_hook(hook)
+            dist.run_command("bdist_axle")
+        finally:
+            os.chdir(old_cwd)
 
     def install(self, wheel_file, user=False, deps=[]):
         check_call([sys.executable, "-m", "pip", "install", "--pre"] +
@@ -106,7 +157,7 @@ class BuildAxleTest(unittest.TestCase):
 
         with open(jp(self.build_dir, "test_axle_1-0.0.1.dist-info", "symlinks.txt")) as f:
             reader = csv.reader(f)
-            symlinks = {l[0]: (l[1], l[2]) for l in reader}
+            symlinks = {row[0]: (row[1], row[2]) for row in reader}
 
         self.assertFalse(exists(jp(self.build_dir, "test_axle_1-0.0.1.dist-info", "require-libpython")))
 
@@ -124,7 +175,7 @@ class BuildAxleTest(unittest.TestCase):
 
         with open(jp(self.build_dir, "test_axle_2_libpython-0.0.1.dist-info", "symlinks.txt")) as f:
             reader = csv.reader(f)
-            symlinks = {l[0]: (l[1], l[2]) for l in reader}
+            symlinks = {row[0]: (row[1], row[2]) for row in reader}
 
         self.assertTrue(exists(jp(self.build_dir, "test_axle_2_libpython-0.0.1.dist-info", "require-libpython")))
 
@@ -143,7 +194,7 @@ class BuildAxleTest(unittest.TestCase):
 
         with open(jp(self.build_dir, "test_issue_12-0.0.1.dist-info", "symlinks.txt")) as f:
             reader = csv.reader(f)
-            symlinks = {l[0]: (l[1], l[2]) for l in reader}
+            symlinks = {row[0]: (row[1], row[2]) for row in reader}
 
         self.assertDictEqual(symlinks, {
             "mypackage/lib/foo.so": ("foo.so.0", '0'),
@@ -152,6 +203,719 @@ class BuildAxleTest(unittest.TestCase):
             "mypackage/lib/prefix/foo.so.0": ("foo.so.0.1", '0'),
         })
 
+    @unittest.skipUnless(shutil.which("gcc") and shutil.which("objcopy"), "requires gcc and objcopy")
+    def test_issue_12_split_debug_info(self):
+        self.copy_src("test_issue_12")
+        lib_path = jp(self.src_dir, "cmake_install", "cpp_libs", "foo.so.0.1")
+        self.compile_shared_lib(lib_path, "foo.so.0")
+        lib_size = getsize(lib_path)
+
+        self.build_axle("test_issue_12", "--split-debug-info")
+
+        self.assertTrue(exists(jp(self.dist_dir, "test_issue_12-0.0.1-py3-none-any.whl")))
+        staged_lib_path = jp(self.build_dir, "mypackage", "lib", "foo.so.0.1")
+        self.assertFalse(islink(staged_lib_path))
+        self.assertLess(getsize(staged_lib_path), lib_size)
+
+        with zipfile.ZipFile(jp(self.dist_dir, "test_issue_12-0.0.1-py3-none-any.debug.zip")) as zf:
+            self.assertListEqual(zf.namelist(), ["mypackage/lib/foo.so.0.1.debug"])
+
+        with open(jp(self.build_dir, "test_issue_12-0.0.1.dist-info", "symlinks.txt")) as f:
+            reader = csv.reader(f)
+            symlinks = {row[0]: (row[1], row[2]) for row in reader}
+
+        self.assertEqual(symlinks["mypackage/lib/foo.so.0"], ("foo.so.0.1", '0'))
+        self.assertEqual(symlinks["mypackage/lib/foo.so"], ("foo.so.0", '0'))
+
+    @unittest.skipUnless(shutil.which("gcc"), "requires gcc")
+    def test_issue_12_elf_index(self):
+        self.copy_src("test_issue_12")
+        lib_dir = jp(self.src_dir, "cmake_install", "cpp_libs")
+        self.compile_shared_lib(jp(lib_dir, "prefix", "foo.so.0.1"), "foo.so.0")
+        self.compile_shared_lib(jp(lib_dir, "foo.so.0.1"), "foo.so.0",
+                                "-Wl,-rpath,$ORIGIN/prefix", "-Wl,--no-as-needed",
+                                f"-L{jp(lib_dir, 'prefix')}", "-l:foo.so.0")
+
+        self.build_axle("test_issue_12", "--elf-index")
+
+        with open(jp(self.build_dir, "test_issue_12-0.0.1.dist-info", "elf-index.json")) as f:
+            elf_index = json.load(f)
+
+        self.assertEqual(elf_index["sonames"], {"foo.so.0": ["mypackage/lib/foo.so.0.1",
+                                                             "mypackage/lib/prefix/foo.so.0.1"]})
+        lib = elf_index["libraries"]["mypackage/lib/foo.so.0.1"]
+        self.assertEqual(lib["runpath"] or lib["rpath"], ["$ORIGIN/prefix"])
+        self.assertIn("foo.so.0", lib["needed"])
+        self.assertEqual(lib["resolved"]["foo.so.0"], "mypackage/lib/prefix/foo.so.0")
+
+    @unittest.skipUnless(shutil.which("gcc"), "requires gcc")
+    def test_issue_12_elf_index_missing_lib(self):
+        self.copy_src("test_issue_12")
+        lib_dir = jp(self.src_dir, "cmake_install", "cpp_libs")
+        self.compile_shared_lib(jp(self.target_dir.name, "libmissing.so"), "libmissing.so")
+        self.compile_shared_lib(jp(lib_dir, "foo.so.0.1"), "foo.so.0",
+                                "-Wl,--no-as-needed", f"-L{self.target_dir.name}", "-lmissing")
+
+        with self.assertRaises(SystemExit) as e:
+            self.build_axle("test_issue_12", "--elf-index")
+
+        self.assertIn("mypackage/lib/foo.so.0.1: libmissing.so", str(e.exception))
+
+    @unittest.skipUnless(shutil.which("gcc"), "requires gcc")
+    def test_issue_12_elf_index_truncated_lib(self):
+        self.copy_src("test_issue_12")
+        lib_path = jp(self.src_dir, "cmake_install", "cpp_libs", "foo.so.0.1")
+        self.compile_shared_lib(lib_path, "foo.so.0")
+        # Keep the ELF header only, the program headers it points at are gone
+        with open(lib_path, "r+b") as f:
+            f.truncate(0x40)
+
+        with self.assertRaises(SystemExit) as e:
+            self.build_axle("test_issue_12", "--elf-index")
+
+        self.assertIn("malformed ELF file", str(e.exception))
+        self.assertIn("foo.so.0.1", str(e.exception))
+
+    def test_axle_1_compile_bytecode(self):
+        self.copy_src("test_axle_1")
+        # Run as `python setup.py` with the start method that re-imports `__main__` in worker processes
+        check_call([sys.executable, "-c",
+                    "import multiprocessing, runpy, sys; multiprocessing.set_start_method('spawn'); "
+                    "sys.argv[0] = 'setup.py'; runpy.run_path('setup.py', run_name='__main__')",
+                    "bdist_axle", "--bdist-dir", self.build_dir, "--dist-dir", self.dist_dir,
+                    "--compile-bytecode", "-j", "2"],
+                   cwd=self.src_dir, env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+
+        pyc_name = f"bar/__pycache__/__init__.{sys.implementation.cache_tag}.pyc"
+        with zipfile.ZipFile(jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")) as zf:
+            record = zf.read("test_axle_1-0.0.1.dist-info/RECORD").decode()
+            pyc = zf.read(pyc_name)
+
+        self.assertIn(pyc_name + ",", record)
+        # PEP 552 hash-based and checked
+        self.assertEqual(int.from_bytes(pyc[4:8], "little"), 0b11)
+        self.assertEqual(marshal.loads(pyc[16:]).co_filename, jp("bar", "__init__.py"))
+
+    def test_axle_1_content_index(self):
+        self.build_axle("test_axle_1", "--content-index")
+
+        wheel_file = jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")
+        with zipfile.ZipFile(wheel_file) as zf:
+            index = json.loads(zf.read("test_axle_1-0.0.1.dist-info/content-index.json"))
+            self.assertEqual(index["algorithm"], "blake2b-128")
+            members = index["members"]
+
+            files = [name for name in zf.namelist() if not name.startswith("test_axle_1-0.0.1.dist-info/")]
+            self.assertEqual(sorted(name for name in members if "link" not in members[name]), sorted(files))
+            for name in files:
+                data = zf.read(name)
+                self.assertEqual(members[name], {"hash": hashlib.blake2b(data, digest_size=16).hexdigest(),
+                                                 "size": len(data)})
+
+        self.assertDictEqual({name: entry for name, entry in members.items() if "link" in entry}, {
+            "bar/foo.so": {"link": "../../../foo.so", "isdir": False},
+            "test_axle_1-0.0.1.data/scripts/script2": {"link": "script1", "isdir": False},
+            "test_axle_1-0.0.1.data/headers/header2.h": {"link": "header1.h", "isdir": False},
+            "test_axle_1-0.0.1.data/data/lib/foo.so": {"link": "foo.1.so", "isdir": False},
+        })
+
+    def verify_axle(self, *args):
+        result = run([sys.executable, "-m", "wheel_axle.verify_axle"] + list(args), stdout=PIPE,
+                     env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        return result.returncode, json.loads(result.stdout)
+
+    def test_axle_1_verify(self):
+        self.build_axle("test_axle_1")
+        wheel_file = jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")
+
+        returncode, report = self.verify_axle(wheel_file, "-j", "2")
+        self.assertEqual(returncode, 0, report)
+        self.assertEqual(report["wheels"][0]["symlinks"], 4)
+
+        report_file = jp(self.target_dir.name, "report.json")
+        self.run_setup("test_axle_1", "verify_axle", "--dist-dir", self.dist_dir, "--report", report_file)
+        with open(report_file) as f:
+            self.assertTrue(json.load(f)["ok"])
+
+        bad_wheel_file = jp(self.target_dir.name, "test_axle_1-0.0.1-py3-none-any.whl")
+        with zipfile.ZipFile(wheel_file) as zin, zipfile.ZipFile(bad_wheel_file, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info in zin.infolist():
+                data = zin.read(info)
+                if info.filename == "bar/__init__.py":
+                    data += b"# tampered\n"
+                elif info.filename == "test_axle_1-0.0.1.dist-info/symlinks.txt":
+                    data += b"bar/missing.so,/opt/missing.so,0\n"
+                elif info.filename == "test_axle_1-0.0.1.dist-info/axle.lck":
+                    continue
+                zout.writestr(info, data)
+
+        returncode, report = self.verify_axle(bad_wheel_file)
+        self.assertEqual(returncode, 1)
+        self.assertFalse(report["ok"])
+        self.assertEqual(sorted((error["check"], error["path"]) for error in report["wheels"][0]["errors"]), [
+            ("markers", "test_axle_1-0.0.1.dist-info/axle.lck"),
+            ("record", "bar/__init__.py"),
+            ("record", "test_axle_1-0.0.1.dist-info/axle.lck"),
+            ("record", "test_axle_1-0.0.1.dist-info/symlinks.txt"),
+            ("symlinks", "bar/missing.so"),
+        ])
+
+        returncode, report = self.verify_axle(bad_wheel_file, "--allowed-external", "/opt/*")
+        self.assertNotIn("symlinks", [error["check"] for error in report["wheels"][0]["errors"]])
+
+        with self.assertRaises(SystemExit):
+            self.run_setup("test_axle_1", "verify_axle", "--wheels", bad_wheel_file)
+
+    def test_axle_2_verify_libpython_req(self):
+        self.build_axle("test_axle_2_libpython", "--require-libpython", "true")
+
+        returncode, report = self.verify_axle(jp(self.dist_dir, "test_axle_2_libpython-0.0.1-py3-none-any.whl"))
+        self.assertEqual(returncode, 0, report)
+
+    def test_axle_1_repack(self):
+        self.build_axle("test_axle_1", "--store-patterns", "*.so")
+        wheel_file = jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")
+        repack_dir = jp(self.target_dir.name, "repack")
+
+        self.run_setup("test_axle_1", "repack_axle", "--dist-dir", self.dist_dir, "--dest-dir", repack_dir,
+                       "--python-tag", "cp3", "--abi-tag", "abi3", "--root-is-pure", "false",
+                       "--require-libpython", "true")
+        self.assertTrue(exists(wheel_file))
+        repacked_file = jp(repack_dir, "test_axle_1-0.0.1-cp3-abi3-any.whl")
+
+        returncode, report = self.verify_axle(repacked_file)
+        self.assertEqual(returncode, 0, report)
+
+        with zipfile.ZipFile(wheel_file) as src, zipfile.ZipFile(repacked_file) as dst:
+            wheelfile = dst.read("test_axle_1-0.0.1.dist-info/WHEEL").decode("utf-8")
+            self.assertIn("Root-Is-Purelib: false\n", wheelfile)
+            self.assertIn("Tag: cp3-abi3-any\n", wheelfile)
+            self.assertIn("Requires-Dist: wheel-axle-runtime<1.0,>0.0.5",
+                          dst.read("test_axle_1-0.0.1.dist-info/METADATA").decode("utf-8"))
+            self.assertIn("test_axle_1-0.0.1.dist-info/require-libpython", dst.namelist())
+            self.assertNotIn("test_axle_1-0.0.1.pth", dst.namelist())
+            self.assertEqual(dst.read("test_axle_1-0.0.1.data/purelib/test_axle_1-0.0.1.pth"),
+                             src.read("test_axle_1-0.0.1.pth"))
+
+            for name in ("bar/__init__.py", "test_axle_1-0.0.1.data/data/lib/foo.1.so"):
+                src_info = src.getinfo(name)
+                dst_info = dst.getinfo(name)
+                self.assertEqual((dst_info.compress_type, dst_info.compress_size, dst_info.CRC),
+                                 (src_info.compress_type, src_info.compress_size, src_info.CRC))
+            with open(repacked_file, "rb") as f:
+                info = dst.getinfo("test_axle_1-0.0.1.data/data/lib/foo.1.so")
+                f.seek(info.header_offset + 26)
+                name_length, extra_length = struct.unpack("<HH", f.read(4))
+                self.assertEqual((info.header_offset + 30 + name_length + extra_length) % 4096, 0)
+
+        # Repacking back in place restores the original wheel byte for byte
+        check_call([sys.executable, "-m", "wheel_axle.repack_axle", repacked_file, "--python-tag", "py3",
+                    "--abi-tag", "none", "--root-is-pure", "true", "--require-libpython", "false"],
+                   env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        self.assertFalse(exists(repacked_file))
+        with open(wheel_file, "rb") as f, open(jp(repack_dir, "test_axle_1-0.0.1-py3-none-any.whl"), "rb") as g:
+            self.assertEqual(f.read(), g.read())
+
+    def test_axle_1_plan(self):
+        self.build_axle("test_axle_1", "--plan")
+
+        self.assertFalse(exists(jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")))
+        self.assertFalse(exists(self.build_dir))
+
+        with open(jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.plan.json")) as f:
+            plan = json.load(f)
+
+        self.assertEqual(plan["wheel"], "test_axle_1-0.0.1-py3-none-any.whl")
+        self.assertEqual(plan["tag"], ["py3", "none", "any"])
+        members = {m["path"]: m for m in plan["members"]}
+        self.assertEqual(members["test_axle_1-0.0.1.data/scripts/script1"]["size"],
+                         getsize(jp(self.src_dir, "scripts", "script1")))
+        self.assertIn("bar/__init__.py", members)
+        self.assertIn("test_axle_1-0.0.1.data/data/lib/foo.1.so", members)
+        self.assertIn("test_axle_1-0.0.1.dist-info/symlinks.txt", members)
+        self.assertGreater(plan["estimated_compressed_size"], 0)
+
+        self.assertDictEqual({s[0]: (s[1], s[2]) for s in plan["symlinks"]}, {
+            "bar/foo.so": ("../../../foo.so", False),
+            "test_axle_1-0.0.1.data/scripts/script2": ("script1", False),
+            "test_axle_1-0.0.1.data/headers/header2.h": ("header1.h", False),
+            "test_axle_1-0.0.1.data/data/lib/foo.so": ("foo.1.so", False),
+        })
+
+    def test_axle_1_plan_root_is_not_pure(self):
+        self.build_axle("test_axle_1", "--root-is-pure", "false", "--plan")
+        plan_file, = glob(jp(self.dist_dir, "*.plan.json"))
+        with open(plan_file) as f:
+            plan = json.load(f)
+        self.build_axle("test_axle_1", "--root-is-pure", "false")
+
+        with zipfile.ZipFile(jp(self.dist_dir, plan["wheel"])) as zf:
+            infos = {info.filename: info for info in zf.infolist() if not info.is_dir()}
+
+        planned = {m["path"]: m for m in plan["members"]}
+        self.assertIn("test_axle_1-0.0.1.data/purelib/test_axle_1-0.0.1.pth", planned)
+        self.assertSetEqual(set(planned), set(infos))
+        for path, member in planned.items():
+            if member["source"] is not None or path.endswith(".pth"):
+                self.assertEqual(member["size"], infos[path].file_size, path)
+
+    def test_axle_1_metadata_only(self):
+        self.build_axle("test_axle_1", "--metadata-only")
+
+        self.assertFalse(exists(jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")))
+        self.assertFalse(exists(self.build_dir))
+        self.assertFalse(exists(jp(self.dist_dir, "test_axle_1-0.0.1.egg-info")))
+
+        distinfo_dir = jp(self.dist_dir, "test_axle_1-0.0.1.dist-info")
+        self.assertEqual(set(os.listdir(distinfo_dir)), {"METADATA", "WHEEL", "top_level.txt", "symlinks.txt",
+                                                         "axle.lck"})
+        metadata = {}
+        for name in ("METADATA", "WHEEL", "symlinks.txt"):
+            with open(jp(distinfo_dir, name), "rb") as f:
+                metadata[name] = f.read()
+        self.assertIn(b"Requires-Dist: wheel-axle-runtime", metadata["METADATA"])
+
+        # Exactly what the wheel holds
+        self.build_axle("test_axle_1")
+        with zipfile.ZipFile(jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")) as zf:
+            self.assertEqual(zf.read("test_axle_1-0.0.1.dist-info/METADATA"), metadata["METADATA"])
+            self.assertEqual(zf.read("test_axle_1-0.0.1.dist-info/WHEEL"), metadata["WHEEL"])
+            self.assertEqual(sorted(zf.read("test_axle_1-0.0.1.dist-info/symlinks.txt").splitlines()),
+                             sorted(metadata["symlinks.txt"].splitlines()))
+
+    def wait_for(self, predicate, timeout=60):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            time.sleep(0.1)
+
+    def watch_axle_1(self, *extra_args):
+        self.copy_src("test_axle_1")
+        wheel_file = jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")
+        log_file = jp(self.target_dir.name, "watch.log")
+
+        def read_log():
+            with open(log_file) as f:
+                return f.read()
+
+        def read_wheel():
+            with zipfile.ZipFile(wheel_file) as zf:
+                return {name: zf.read(name) for name in zf.namelist()}
+
+        with open(log_file, "w") as log:
+            proc = Popen([sys.executable, "setup.py", "bdist_axle", "--bdist-dir", self.build_dir,
+                          "--dist-dir", self.dist_dir, "--watch", *extra_args],
+                         cwd=self.src_dir, stdout=log, stderr=STDOUT)
+        try:
+            self.wait_for(lambda: "watching" in read_log())
+            members = read_wheel()
+
+            # A changed file, a new symlink among the package data and a symlink replaced by a file
+            with open(jp(self.src_dir, "data", "lib", "foo.1.so"), "ab") as f:
+                f.write(b"changed")
+            os.symlink("foo.so", jp(self.src_dir, "src", "bar", "baz.so"))
+            os.unlink(jp(self.src_dir, "headers", "header2.h"))
+            with open(jp(self.src_dir, "headers", "header2.h"), "w") as f:
+                f.write("header2\n")
+
+            self.wait_for(lambda: read_log().count("rewrote") and
+                          b"bar/baz.so" in read_wheel()["test_axle_1-0.0.1.dist-info/symlinks.txt"] and
+                          "test_axle_1-0.0.1.data/headers/header2.h" in read_wheel())
+        finally:
+            proc.send_signal(signal.SIGINT)
+            proc.wait(60)
+        self.assertEqual(proc.returncode, 0, read_log())
+
+        rewritten = read_wheel()
+        self.assertEqual(rewritten["test_axle_1-0.0.1.data/data/lib/foo.1.so"],
+                         members["test_axle_1-0.0.1.data/data/lib/foo.1.so"] + b"changed")
+        self.assertEqual(rewritten["test_axle_1-0.0.1.data/headers/header2.h"], b"header2\n")
+        self.assertEqual(rewritten["bar/__init__.py"], members["bar/__init__.py"])
+        self.assertEqual(sorted(rewritten["test_axle_1-0.0.1.dist-info/symlinks.txt"].decode().splitlines()),
+                         ["bar/baz.so,foo.so,0",
+                          "bar/foo.so,../../../foo.so,0",
+                          "test_axle_1-0.0.1.data/data/lib/foo.so,foo.1.so,0",
+                          "test_axle_1-0.0.1.data/scripts/script2,script1,0"])
+        check_call(["twine", "check", "--strict", wheel_file])
+
+    def test_axle_1_watch(self):
+        self.watch_axle_1()
+
+    def test_axle_1_watch_polling(self):
+        self.watch_axle_1("--watch-poll-interval", "0.1")
+
+    def test_axle_1_build_threads(self):
+        import setuptools  # noqa: F401
+        from concurrent.futures import ThreadPoolExecutor
+        from wheel_axle.bdist_axle import build
+
+        project_dirs = [jp(self.target_dir.name, f"project_{idx}") for idx in range(4)]
+        for project_dir in project_dirs:
+            shutil.copytree(jp(self.test_dir, "test_axle_1"), project_dir, symlinks=True)
+
+        old_cwd = os.getcwd()
+        old_sys_argv = list(sys.argv)
+        # Not even rebound meanwhile
+        seen_sys_argvs = set()
+        done = threading.Event()
+
+        def watch_sys_argv():
+            while not done.is_set():
+                seen_sys_argvs.add(tuple(sys.argv))
+
+        watcher = threading.Thread(target=watch_sys_argv)
+        watcher.start()
+        try:
+            with ThreadPoolExecutor(len(project_dirs)) as executor:
+                wheel_sets = list(executor.map(lambda idx: build(project_dirs[idx], jp(project_dirs[idx], "dist"),
+                                                                 layout=idx % 2 == 0),
+                                               range(len(project_dirs))))
+        finally:
+            done.set()
+            watcher.join()
+        self.assertEqual(os.getcwd(), old_cwd)
+        self.assertEqual(sys.argv, old_sys_argv)
+        self.assertSetEqual(seen_sys_argvs, {tuple(old_sys_argv)})
+
+        for project_dir, wheel_files in zip(project_dirs, wheel_sets):
+            wheel_file = jp(project_dir, "dist", "test_axle_1-0.0.1-py3-none-any.whl")
+            self.assertEqual(wheel_files, [wheel_file])
+            self.assertTrue(exists(jp(project_dir, "build")))
+            with zipfile.ZipFile(wheel_file) as zf:
+                self.assertIn("test_axle_1-0.0.1.data/scripts/script1", zf.namelist())
+                self.assertIn("test_axle_1-0.0.1.data/data/lib/foo.1.so", zf.namelist())
+                self.assertEqual(sorted(zf.read("test_axle_1-0.0.1.dist-info/symlinks.txt").decode().splitlines()),
+                                 ["bar/foo.so,../../../foo.so,0",
+                                  "test_axle_1-0.0.1.data/data/lib/foo.so,foo.1.so,0",
+                                  "test_axle_1-0.0.1.data/headers/header2.h,header1.h,0",
+                                  "test_axle_1-0.0.1.data/scripts/script2,script1,0"])
+            check_call(["twine", "check", "--strict", wheel_file])
+
+        # Compared by name: `distutils` is the one of setuptools or of the standard library depending on the tests run
+        with self.assertRaisesRegex(Exception, "no_such_option") as e:
+            build(project_dirs[0], jp(project_dirs[0], "dist"), no_such_option=True)
+        self.assertEqual(type(e.exception).__name__, "DistutilsOptionError")
+
+    def test_issue_12_build(self):
+        import setuptools  # noqa: F401
+        from concurrent.futures import ThreadPoolExecutor
+        from wheel_axle.bdist_axle import build
+
+        # The package data comes from MANIFEST.in, resolved in the project dir while another project builds
+        project_dirs = [jp(self.target_dir.name, name) for name in ("test_issue_12", "test_axle_1")]
+        for project_dir in project_dirs:
+            shutil.copytree(jp(self.test_dir, os.path.basename(project_dir)), project_dir, symlinks=True)
+        with open(jp(project_dirs[0], "cmake_install", "cpp_libs", "foo.txt"), "wt") as f:
+            f.write("foo")
+        with open(jp(project_dirs[0], "MANIFEST.in"), "wt") as f:
+            f.write("include cmake_install/cpp_libs/*.txt\n")
+
+        old_cwd = os.getcwd()
+        with ThreadPoolExecutor(len(project_dirs)) as executor:
+            wheel_sets = list(executor.map(lambda project_dir: build(project_dir, jp(project_dir, "dist")),
+                                           project_dirs))
+        self.assertEqual(os.getcwd(), old_cwd)
+
+        wheel_file = jp(project_dirs[0], "dist", "test_issue_12-0.0.1-py3-none-any.whl")
+        self.assertEqual(wheel_sets[0], [wheel_file])
+        with zipfile.ZipFile(wheel_file) as zf:
+            self.assertIn("mypackage/lib/foo.so.0.1", zf.namelist())
+            self.assertEqual(zf.read("mypackage/lib/foo.txt"), b"foo")
+            self.assertEqual(sorted(zf.read("test_issue_12-0.0.1.dist-info/symlinks.txt").decode().splitlines()),
+                             ["mypackage/lib/foo.so,foo.so.0,0",
+                              "mypackage/lib/foo.so.0,foo.so.0.1,0",
+                              "mypackage/lib/prefix/foo.so,foo.so.0,0",
+                              "mypackage/lib/prefix/foo.so.0,foo.so.0.1,0"])
+        with open(jp(project_dirs[0], "test_issue_12.egg-info", "SOURCES.txt")) as f:
+            self.assertIn("cmake_install/cpp_libs/foo.txt", f.read().splitlines())
+
+    def test_axle_1_skip_unchanged(self):
+        wheel_file = jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")
+
+        def build_axle():
+            self.build_axle("test_axle_1", "--skip-unchanged")
+            return os.stat(wheel_file).st_mtime_ns
+
+        mtime = build_axle()
+
+        with zipfile.ZipFile(wheel_file) as zf:
+            self.assertIn("test_axle_1-0.0.1.dist-info/axle-fingerprint.txt", zf.namelist())
+
+        self.assertEqual(build_axle(), mtime)
+
+        # Touched, but not changed
+        script_path = jp(self.src_dir, "scripts", "script1")
+        os.utime(script_path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+        self.assertEqual(build_axle(), mtime)
+
+        with open(script_path, "a") as f:
+            f.write("# changed\n")
+        self.assertNotEqual(build_axle(), mtime)
+
+        # Replaced by a build without the fingerprint
+        self.build_axle("test_axle_1", "--data-wheel-patterns", "*.data/data/*")
+        build_axle()
+        with zipfile.ZipFile(wheel_file) as zf:
+            self.assertIn("test_axle_1-0.0.1.data/data/lib/foo.1.so", zf.namelist())
+
+    def test_axle_1_data_wheels(self):
+        wheel_file = jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")
+        data_wheel_file = jp(self.dist_dir, "test_axle_1_data-0.0.1-py3-none-any.whl")
+
+        def read_data_wheel():
+            with open(data_wheel_file, "rb") as f:
+                return f.read()
+
+        self.build_axle("test_axle_1", "--data-wheel-patterns", "*.data/data/*")
+
+        with zipfile.ZipFile(wheel_file) as zf:
+            names = zf.namelist()
+            metadata = zf.read("test_axle_1-0.0.1.dist-info/METADATA").decode()
+            symlinks = {row[0] for row in csv.reader(zf.read("test_axle_1-0.0.1.dist-info/symlinks.txt")
+                                                     .decode().splitlines())}
+        self.assertNotIn("test_axle_1-0.0.1.data/data/lib/foo.1.so", names)
+        self.assertIn("test_axle_1-0.0.1.data/scripts/script1", names)
+        self.assertIn("Requires-Dist: test-axle-1-data==0.0.1", metadata)
+        self.assertSetEqual(symlinks, {"bar/foo.so", "test_axle_1-0.0.1.data/scripts/script2",
+                                       "test_axle_1-0.0.1.data/headers/header2.h"})
+
+        with zipfile.ZipFile(data_wheel_file) as zf:
+            names = zf.namelist()
+            symlinks = {row[0]: row[1] for row in csv.reader(zf.read("test_axle_1_data-0.0.1.dist-info/symlinks.txt")
+                                                             .decode().splitlines())}
+        self.assertIn("test_axle_1_data-0.0.1.data/data/lib/foo.1.so", names)
+        self.assertIn("test_axle_1_data-0.0.1.pth", names)
+        self.assertIn("test_axle_1_data-0.0.1.dist-info/axle.lck", names)
+        self.assertDictEqual(symlinks, {"test_axle_1_data-0.0.1.data/data/lib/foo.so": "foo.1.so"})
+
+        # A change outside of the companion leaves it byte-identical
+        data_wheel = read_data_wheel()
+        with open(jp(self.src_dir, "scripts", "script1"), "a") as f:
+            f.write("# changed\n")
+        self.build_axle("test_axle_1", "--data-wheel-patterns", "*.data/data/*")
+        self.assertEqual(read_data_wheel(), data_wheel)
+
+    def test_axle_1_data_wheels_verify(self):
+        # `bar/foo.so` stays in the wheel, but resolves to the `lib/foo.so` symlink and `lib/foo.1.so` of the companion
+        self.build_axle("test_axle_1", "--data-wheel-patterns", "*.1.so")
+        wheel_file = jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")
+        data_wheel_file = jp(self.dist_dir, "test_axle_1_data-0.0.1-py3-none-any.whl")
+        with zipfile.ZipFile(wheel_file) as zf:
+            self.assertIn("bar/foo.so,../../../foo.so,0", zf.read("test_axle_1-0.0.1.dist-info/symlinks.txt").decode())
+
+        returncode, report = self.verify_axle(wheel_file, data_wheel_file)
+        self.assertEqual(returncode, 0, report)
+        returncode, report = self.verify_axle(wheel_file)
+        self.assertEqual(returncode, 1)
+        self.assertEqual([error["path"] for error in report["wheels"][0]["errors"]], ["bar/foo.so"])
+
+        # A wheel that is not an axle is left out of the dist-dir
+        with zipfile.ZipFile(jp(self.dist_dir, "other-1.0-py3-none-any.whl"), "w") as zf:
+            zf.writestr("other-1.0.dist-info/METADATA", "Metadata-Version: 2.1\nName: other\nVersion: 1.0\n")
+            zf.writestr("other-1.0.dist-info/RECORD", "")
+
+        report_file = jp(self.target_dir.name, "report.json")
+        self.run_setup("test_axle_1", "verify_axle", "--dist-dir", self.dist_dir, "--report", report_file)
+        with open(report_file) as f:
+            report = json.load(f)
+        self.assertTrue(report["ok"], report)
+        self.assertEqual([wheel_report["wheel"] for wheel_report in report["wheels"]], [wheel_file, data_wheel_file])
+
+        repack_dir = jp(self.target_dir.name, "repack")
+        self.run_setup("test_axle_1", "repack_axle", "--dist-dir", self.dist_dir, "--dest-dir", repack_dir,
+                       "--python-tag", "cp3", "--root-is-pure", "false")
+        repacked_files = sorted(glob(jp(repack_dir, "*.whl")))
+        self.assertEqual([os.path.basename(repacked_file) for repacked_file in repacked_files],
+                         ["test_axle_1-0.0.1-cp3-none-any.whl", "test_axle_1_data-0.0.1-cp3-none-any.whl"])
+        returncode, report = self.verify_axle(*repacked_files)
+        self.assertEqual(returncode, 0, report)
+
+    def test_axle_1_data_wheels_install(self):
+        # The headers stay and the symlinks go along with their targets into the companion
+        self.build_axle("test_axle_1", "--data-wheel-threshold", "1", "--data-wheel-patterns", "*.data/headers/*")
+
+        wheel_files = sorted(glob(jp(self.dist_dir, "*.whl")))
+        self.assertListEqual([os.path.basename(wheel_file) for wheel_file in wheel_files],
+                             ["test_axle_1-0.0.1-py3-none-any.whl", "test_axle_1_data-0.0.1-py3-none-any.whl"])
+        with zipfile.ZipFile(wheel_files[1]) as zf:
+            names = zf.namelist()
+            symlinks = {row[0] for row in csv.reader(zf.read("test_axle_1_data-0.0.1.dist-info/symlinks.txt")
+                                                     .decode().splitlines())}
+        self.assertFalse([name for name in names if "/headers/" in name])
+        self.assertSetEqual(symlinks, {"test_axle_1_data-0.0.1.data/scripts/script2",
+                                       "test_axle_1_data-0.0.1.data/data/lib/foo.so"})
+
+        def find_links():
+            return {jp(root, name) for root, dirs, files in os.walk(venv_dir) for name in dirs + files
+                    if islink(jp(root, name))}
+
+        # The runtime finalizes distributions installed into a scheme of the interpreter only, not into a `--prefix`
+        venv_dir = jp(self.target_dir.name, "venv")
+        check_call([sys.executable, "-m", "venv", "--without-pip", venv_dir])
+        venv_links = find_links()
+        # With the runtime and pip importable while `site` processes the `.pth` files of the venv
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        venv_python = jp(venv_dir, "bin", "python")
+        check_call([venv_python, "-m", "pip", "install", "--no-deps"] + wheel_files, env=env)
+        # Finalizes both distributions
+        check_call([venv_python, "-c", "import site"], env=env)
+
+        links = find_links() - venv_links
+        self.assertEqual(len(links), 4)
+        for link in links:
+            self.assertTrue(exists(link), f"{link} -> {os.readlink(link)} is dangling")
+
+    def test_axle_1_layout(self):
+        self.build_axle("test_axle_1", "--store-patterns", "*.so")
+
+        wheel_file = jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")
+        with zipfile.ZipFile(wheel_file) as zf:
+            infos = zf.infolist()
+            names = [info.filename for info in infos]
+            self.assertTrue(all(name.startswith("test_axle_1-0.0.1.dist-info/") for name in names[:6]))
+            self.assertIn("test_axle_1-0.0.1.dist-info/symlinks.txt", names[:6])
+            self.assertEqual(names[5], "test_axle_1-0.0.1.dist-info/RECORD")
+            self.assertLess(names.index("bar/__init__.py"), names.index("test_axle_1-0.0.1.data/headers/header1.h"))
+            self.assertLess(names.index("test_axle_1-0.0.1.data/headers/header1.h"),
+                            names.index("test_axle_1-0.0.1.data/scripts/script1"))
+
+            stored = [info for info in infos if info.compress_type == zipfile.ZIP_STORED]
+            self.assertListEqual([info.filename for info in stored], ["test_axle_1-0.0.1.data/data/lib/foo.1.so"])
+            zf.fp.seek(stored[0].header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", zf.fp.read(4))
+            self.assertEqual((stored[0].header_offset + 30 + name_length + extra_length) % 4096, 0)
+
+        # The copied RECORD still matches the contents
+        from wheel_axle.bdist_axle import WheelFile
+        with WheelFile(wheel_file) as wf:
+            for name in names:
+                wf.read(name)
+
+    def test_axle_1_sdist(self):
+        self.run_setup("test_axle_1", "sdist_axle", "--dist-dir", self.dist_dir, "-j", "2",
+                       "--gzip-block-size", "1024")
+
+        sdist_file = jp(self.dist_dir, "test-axle-1-0.0.1.tar.gz")
+        check_call(["gzip", "-t", sdist_file])
+        with tarfile.open(sdist_file) as tf:
+            members = {m.name: m for m in tf.getmembers()}
+
+        self.assertTrue(members["test-axle-1-0.0.1/setup.py"].isfile())
+        self.assertTrue(members["test-axle-1-0.0.1/data/lib/foo.1.so"].isfile())
+        for path, link_dest in (("data/lib/foo.so", "foo.1.so"),
+                                ("scripts/script2", "script1"),
+                                ("src/bar/foo.so", "../../../foo.so")):
+            member = members["test-axle-1-0.0.1/" + path]
+            self.assertTrue(member.issym(), path)
+            self.assertEqual(member.linkname, link_dest)
+
+    def test_axle_1_event_hooks(self):
+        events = []
+        with self.assertLogs("wheel", "INFO") as logs:
+            self.build_axle_with_hook("test_axle_1", lambda event, *args: events.append((event,) + args))
+
+        # Reported as events while written rather than logged one by one
+        self.assertListEqual([record for record in logs.records if record.getMessage().startswith("adding ")], [])
+
+        phases = [e[1] for e in events if e[0] == "phase_start"]
+        self.assertEqual(phases[0], "bdist_axle")
+        self.assertIn("install_lib", phases)
+        self.assertEqual(len(phases), len([e for e in events if e[0] == "phase_end"]))
+
+        symlinks = {e[2][len(self.build_dir) + 1:]: e[3] for e in events if e[0] == "symlink_registered"}
+        self.assertDictEqual(symlinks, {
+            "bar/foo.so": "../../../foo.so",
+            "test_axle_1-0.0.1.data/scripts/script2": "script1",
+            "test_axle_1-0.0.1.data/headers/header2.h": "header1.h",
+            "test_axle_1-0.0.1.data/data/lib/foo.so": "foo.1.so",
+        })
+        self.assertIn(jp(self.build_dir, "bar", "__init__.py"), [e[2] for e in events if e[0] == "file_staged"])
+
+        members = [e[1] for e in events if e[0] == "member_written"]
+        with zipfile.ZipFile(jp(self.dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")) as zf:
+            self.assertListEqual(members, zf.namelist())
+
+        # A plain `bdist_wheel` is left alone once the axle is built
+        from wheel_axle.bdist_axle import BdistAxle, WheelFile
+        self.assertIs(sys.modules[BdistAxle.__bases__[0].__module__].WheelFile, WheelFile)
+        self.assertListEqual(logging.getLogger("wheel").filters, [])
+
+    def test_axle_1_parallel_install(self):
+        def build_axle(name, **options):
+            build_dir = jp(self.target_dir.name, name, "build")
+            dist_dir = jp(self.target_dir.name, name, "dist")
+            events = []
+            self.build_axle_with_hook("test_axle_1", lambda event, *args: events.append(
+                (event,) + tuple(arg.replace(build_dir, "") if isinstance(arg, str) else arg for arg in args)),
+                build_dir, dist_dir, **options)
+
+            with zipfile.ZipFile(jp(dist_dir, "test_axle_1-0.0.1-py3-none-any.whl")) as zf:
+                return events, [(info.filename, zf.read(info)) for info in zf.infolist()]
+
+        events, members = build_axle("sequential")
+        parallel_events, parallel_members = build_axle("parallel", parallel_install=True, jobs=4)
+
+        self.assertListEqual(parallel_members, members)
+        self.assertListEqual(parallel_events, events)
+        phases = [e[1] for e in events if e[0] == "phase_start"]
+        self.assertLess(phases.index("install_lib"), phases.index("install_headers"))
+
+    def run_pth(self, pth_path, check=True):
+        """Runs the `.pth` line as `site` does, printing the number of filesystem calls it made"""
+        return run([sys.executable, "-S", "-X", "importtime", "-c",
+                    "import os, sys\n"
+                    "calls = []\n"
+                    "def counted(func):\n"
+                    "    return lambda *args, **kwargs: calls.append(func.__name__) or func(*args, **kwargs)\n"
+                    "for name in ('stat', 'lstat', 'access', 'listdir', 'scandir', 'open'):\n"
+                    "    setattr(os, name, counted(getattr(os, name)))\n"
+                    f"fullname = {pth_path!r}\n"
+                    "with open(fullname) as f:\n"
+                    "    line = f.read()\n"
+                    "exec(line)\n"
+                    "print(len(calls))"],
+                   stdout=PIPE, stderr=PIPE, check=check, universal_newlines=True)
+
+    def test_axle_1_pth_stub(self):
+        self.build_axle("test_axle_1")
+
+        site_dir = jp(self.target_dir.name, "site")
+        dist_info_dir = jp(site_dir, "test_axle_1-0.0.1.dist-info")
+        os.makedirs(dist_info_dir)
+        pth_path = jp(site_dir, "test_axle_1-0.0.1.pth")
+        shutil.copy(jp(self.build_dir, "test_axle_1-0.0.1.pth"), pth_path)
+
+        # Stale `.pth` of a removed distribution
+        result = self.run_pth(pth_path)
+        self.assertNotIn("wheel_axle", result.stderr)
+        self.assertEqual(result.stdout.strip(), "1")
+
+        lock_path = jp(dist_info_dir, "axle.lck")
+        with open(lock_path, "wb"):
+            pass
+
+        # Distribution not writable by this process
+        if os.geteuid() != 0:
+            os.chmod(lock_path, 0o444)
+            try:
+                result = self.run_pth(pth_path)
+            finally:
+                os.chmod(lock_path, 0o644)
+            self.assertNotIn("wheel_axle", result.stderr)
+            self.assertEqual(result.stdout.strip(), "1")
+
+        # Distribution finalized, but its `.pth` could not be removed
+        done_path = jp(dist_info_dir, "axle.done")
+        with open(done_path, "wb"):
+            pass
+        result = self.run_pth(pth_path)
+        self.assertNotIn("wheel_axle", result.stderr)
+        self.assertEqual(result.stdout.strip(), "2")
+        os.unlink(done_path)
+
+        # Distribution to finalize
+        self.assertIn("wheel_axle.runtime", self.run_pth(pth_path, check=False).stderr)
+
     def get_platform(self):
         return get_platform(self.build_dir).lower().replace('-', '_').replace('.', '_')
 
@@ -7,6 +7,9 @@ from os.path import abspath, dirname, join as jp
 from setuptools import setup, find_packages
 
 import wheel_axle.bdist_axle
+import wheel_axle.repack_axle
+import wheel_axle.sdist_axle
+import wheel_axle.verify_axle
 
 
 def get_data_files(current_path=None, ignore_root=False):
@@ -69,5 +72,8 @@ setup(
     dependency_links=[],
     zip_safe=False,
     obsoletes=[],
-    cmdclass={"bdist_axle": wheel_axle.bdist_axle.BdistAxle}
+    cmdclass={"bdist_axle": wheel_axle.bdist_axle.BdistAxle,
+              "sdist_axle": wheel_axle.sdist_axle.SdistAxle,
+              "verify_axle": wheel_axle.verify_axle.VerifyAxle,
+              "repack_axle": wheel_axle.repack_axle.RepackAxle}
 )
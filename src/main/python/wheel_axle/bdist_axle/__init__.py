@@ -16,15 +16,35 @@
 #
 
 import contextlib
+import distutils.errors
+import fnmatch
 import itertools
+import json
+import logging
 import os
+import posixpath
 import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import warnings
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from distutils import log
 from distutils.cmd import Command
 from distutils.command.build_scripts import build_scripts
 from distutils.command.install_data import install_data
 from distutils.command.install_headers import install_headers
+from distutils.dir_util import remove_tree
+from distutils.core import run_setup
+from distutils.errors import DistutilsError, DistutilsExecError, DistutilsFileError, DistutilsOptionError
+from distutils.file_util import copy_file
 from distutils.util import convert_path
+from email.generator import BytesGenerator
+from email.message import Message
 from glob import glob
 
 from setuptools.command.build_py import build_py
@@ -35,31 +55,94 @@ from setuptools.command.install_scripts import install_scripts
 
 try:
     # SetupTools >= 70.1
-    from setuptools.command.bdist_wheel import bdist_wheel as _bdist_wheel, python_tag, tags
+    from setuptools.command.bdist_wheel import (bdist_wheel as _bdist_wheel, python_tag, safer_name, safer_version,
+                                                tags)
 except ImportError as e:
     try:
         # Wheel >= 0.44.0
-        from wheel._bdist_wheel import bdist_wheel as _bdist_wheel, python_tag, tags
+        from wheel._bdist_wheel import bdist_wheel as _bdist_wheel, python_tag, safer_name, safer_version, tags
     except ImportError:
         # Wheel < 0.44.0
         try:
-            from wheel.bdist_wheel import bdist_wheel as _bdist_wheel, python_tag, tags
+            from wheel.bdist_wheel import bdist_wheel as _bdist_wheel, python_tag, safer_name, safer_version, tags
         except ImportError:
             raise ImportError("Either `setuptools>=70.1` package or `wheel` package is required")
 
-from wheel_axle.bdist_axle._file_utils import copy_link, copy_tree
-from wheel_axle.runtime._symlinks import write_symlinks_file
-from wheel_axle.runtime.constants import AXLE_LOCK_FILE, SYMLINKS_FILE, REQUIRE_LIBPYTHON_FILE
+from wheel_axle.bdist_axle._events import (AxleEvents, FILE_STAGED, MEMBER_WRITTEN, NO_EVENTS, SYMLINK_REGISTERED,
+                                           SummaryLogHook)
+from wheel_axle.bdist_axle._elf_utils import is_elf_file, read_elf_dynamic, split_debug_info
+from wheel_axle.bdist_axle._file_utils import (CONTENT_HASH_ALGORITHM, byte_compile_file, byte_compile_files,
+                                               content_digest, content_hash, copy_link, copy_tree,
+                                               estimate_compressed_size, stat_digest)
+from wheel_axle.bdist_axle._path_store import PathList, PathStore, SymlinkList
+from wheel_axle.bdist_axle._watch import open_watcher
+from wheel_axle.bdist_axle._zip_utils import copy_member
+from wheel_axle.runtime._symlinks import read_symlinks_file, write_symlinks_file
+from wheel_axle.runtime.constants import AXLE_DONE_FILE, AXLE_LOCK_FILE, SYMLINKS_FILE, REQUIRE_LIBPYTHON_FILE
+
+# The archive writer of whichever `bdist_wheel` is in use
+WheelFile = sys.modules[_bdist_wheel.__module__].WheelFile
+
 
 __version__ = "${dist_version}"
 WHEEL_AXLE_DEPENDENCY = "wheel-axle-runtime<1.0"
 WHEEL_AXLE_REQUIRE_LIBPYTHON_DEPENDENCY = f"{WHEEL_AXLE_DEPENDENCY},>0.0.5"
 
+ELF_INDEX_FILE = "elf-index.json"
+CONTENT_INDEX_FILE = "content-index.json"
+FINGERPRINT_FILE = "axle-fingerprint.txt"
+
+# Options that do not affect the contents of the wheel
+FINGERPRINT_IGNORED_OPTIONS = {"bdist_dir", "dist_dir", "keep_temp", "skip_build", "debug_info_dir", "jobs", "plan",
+                               "skip_unchanged", "metadata_only", "watch", "watch_poll_interval", "parallel_install"}
+
+# Install sub-commands writing to disjoint trees of the bdist-dir, run concurrently with --parallel-install
+PARALLEL_INSTALL_COMMANDS = ["install_lib", "install_headers", "install_scripts", "install_data"]
+
+# The earliest date a ZIP member can have
+ZIP_MINIMUM_TIMESTAMP = 315532800
+
+# Install schemes of the `.data` directory in the order their members are laid out
+LAYOUT_SCHEMES = ["purelib", "platlib", "headers", "scripts", "data"]
+
+# Local file header, central directory record and data descriptor per ZIP member, excluding the name
+ZIP_MEMBER_OVERHEAD = 30 + 46 + 16
+
+# Libraries that are expected to be provided by the target system, following the manylinux policies
+ELF_EXTERNAL_LIBS = ["libc.so.*", "libm.so.*", "libdl.so.*", "librt.so.*", "libpthread.so.*",
+                     "libutil.so.*", "libnsl.so.*", "libcrypt.so.*", "libresolv.so.*",
+                     "libgcc_s.so.*", "libstdc++.so.*", "ld-linux*.so.*", "ld64.so.*",
+                     "libpython*.so*", "libX11.so.*", "libXext.so.*", "libXrender.so.*", "libICE.so.*",
+                     "libSM.so.*", "libGL.so.*", "libgobject-2.0.so.*", "libgthread-2.0.so.*",
+                     "libglib-2.0.so.*", "libz.so.*", "libexpat.so.*"]
+
+
+def get_events(cmd):
+    """Returns the events of the `bdist_axle` run the command `cmd` is part of"""
+    return getattr(cmd.distribution, "axle_events", NO_EVENTS)
+
+
+def get_path_store(cmd):
+    """Returns the path store shared by the commands of the `bdist_axle` run `cmd` is part of"""
+    store = getattr(cmd.distribution, "axle_paths", None)
+    if store is None:
+        store = PathStore()
+    return store
+
+
+def copy_staged_file(cmd, infile, outfile, preserve_mode=1, preserve_times=1, link=None):
+    """Copies a file for `cmd` reporting it as a `FILE_STAGED` event instead of logging it"""
+    events = get_events(cmd)
+    out = copy_file(infile, outfile, preserve_mode, preserve_times, not cmd.force, link,
+                    verbose=0, dry_run=cmd.dry_run)
+    events.emit(FILE_STAGED, infile, out[0])
+    return out
+
 
 class SymlinkAwareCommmand(Command):
     def initialize_options(self):
         super().initialize_options()
-        self._symlinks = []
+        self._symlinks = SymlinkList(get_path_store(self))
 
     def copy_file(self, infile, outfile, preserve_mode=1, preserve_times=1,
                   link=None, level=1):
@@ -67,11 +150,16 @@ class SymlinkAwareCommmand(Command):
         former two default to whatever is in the Distribution object, and
         the latter defaults to false for commands that don't define it.)"""
 
+        events = get_events(self)
         if os.path.islink(infile):
-            out = copy_link(infile, outfile, not self.force, dry_run=self.dry_run)
+            out = copy_link(infile, outfile, not self.force, dry_run=self.dry_run,
+                            events=None if events is NO_EVENTS else events)
             self._symlinks.append(out)
             return out[0], 0
 
+        if events is not NO_EVENTS:
+            return copy_staged_file(self, infile, outfile, preserve_mode, preserve_times, link)
+
         return super().copy_file(infile, outfile, preserve_mode=preserve_mode, preserve_times=preserve_times,
                                  link=link,
                                  level=level)
@@ -82,10 +170,12 @@ class SymlinkAwareCommmand(Command):
         and force flags.
         """
 
-        output, symlinks = copy_tree(infile, outfile, preserve_mode,
-                                     preserve_times, preserve_symlinks,
-                                     not self.force, dry_run=self.dry_run)
-        self._symlinks.extend(symlinks)
+        events = get_events(self)
+        output, _ = copy_tree(infile, outfile, preserve_mode,
+                              preserve_times, preserve_symlinks,
+                              not self.force, dry_run=self.dry_run,
+                              events=None if events is NO_EVENTS else events,
+                              outputs=PathList(self._symlinks.store), links=self._symlinks)
         return output
 
     def get_symlinks(self):
@@ -93,6 +183,10 @@ class SymlinkAwareCommmand(Command):
 
 
 class InstallData(SymlinkAwareCommmand, install_data):
+    def initialize_options(self):
+        super().initialize_options()
+        self.outfiles = PathList(self._symlinks.store)
+
     def run(self):
         super().run()
         symlinks = set(self.get_symlinks())
@@ -118,7 +212,8 @@ class InstallLib(SymlinkAwareCommmand, install_lib):
         from setuptools.archive_util import unpack_directory
         from distutils import log
 
-        outfiles = []
+        outfiles = PathList(self._symlinks.store)
+        events = get_events(self)
 
         def pf(src, dst):
             if dst in exclude:
@@ -129,11 +224,15 @@ class InstallLib(SymlinkAwareCommmand, install_lib):
             if os.path.islink(src):
                 link_dest = os.readlink(src)
                 link_dest_isdir = os.path.isdir(os.path.join(os.path.dirname(src), link_dest))
-                log.info("registering link %s (%s) -> %s", src, link_dest, dst)
+                if events is NO_EVENTS:
+                    log.info("registering link %s (%s) -> %s", src, link_dest, dst)
+                events.emit(SYMLINK_REGISTERED, src, dst, link_dest, link_dest_isdir)
                 self._symlinks.append((dst, link_dest, link_dest_isdir))
                 return False
             else:
-                log.info("copying %s -> %s", src, os.path.dirname(dst))
+                if events is NO_EVENTS:
+                    log.info("copying %s -> %s", src, os.path.dirname(dst))
+                events.emit(FILE_STAGED, src, dst)
                 outfiles.append(dst)
                 return dst
 
@@ -144,7 +243,7 @@ class InstallLib(SymlinkAwareCommmand, install_lib):
         symlinks = super().get_symlinks()
         exclude = self.get_exclusions()
         if exclude:
-            return [f for f in symlinks if f[0] not in exclude]
+            return symlinks.select(lambda f: f not in exclude)
         return symlinks
 
 
@@ -185,10 +284,15 @@ class BuildPy(build_py):
         former two default to whatever is in the Distribution object, and
         the latter defaults to false for commands that don't define it.)"""
 
+        events = get_events(self)
         if os.path.islink(infile):
-            out = copy_link(infile, outfile, not self.force, dry_run=self.dry_run, reproduce_link=True)
+            out = copy_link(infile, outfile, not self.force, dry_run=self.dry_run, reproduce_link=True,
+                            events=None if events is NO_EVENTS else events)
             return out[0], 1
 
+        if events is not NO_EVENTS:
+            return copy_staged_file(self, infile, outfile, preserve_mode, preserve_times, link)
+
         return super().copy_file(infile, outfile, preserve_mode=preserve_mode, preserve_times=preserve_times,
                                  link=link,
                                  level=level)
@@ -274,14 +378,12 @@ class BuildScripts(SymlinkAwareCommmand, build_scripts):
 class Install(install):
     def get_symlinks(self):
         """Assembles the symlinks of all the sub-commands."""
-        symlinks = []
+        symlinks = SymlinkList(get_path_store(self))
         for cmd_name in self.get_sub_commands():
             cmd = self.get_finalized_command(cmd_name)
 
             try:
-                for filename in cmd.get_symlinks():
-                    if filename not in symlinks:
-                        symlinks.append(filename)
+                symlinks.merge(cmd.get_symlinks())
             except AttributeError:
                 pass
 
@@ -289,6 +391,7 @@ class Install(install):
 
     def initialize_options(self):
         super().initialize_options()
+        self._buffered_events = {}
 
     def finalize_options(self):
         super().finalize_options()
@@ -304,14 +407,148 @@ class Install(install):
             self.install_lib = self.install_libbase
 
     def run(self):
+        jobs = getattr(self.distribution, "axle_install_jobs", 1)
+        if jobs > 1:
+            self.run_sub_commands_concurrently(jobs)
         super().run()
 
+    def run_sub_commands_concurrently(self, jobs):
+        """Runs the sub-commands writing to disjoint trees on up to `jobs` threads ahead of the others.
+
+        Once run they are skipped by `install.run`, which replays the events held back for each of them in its turn.
+        The outputs and symlinks of every sub-command are kept apart until `get_outputs` and `get_symlinks` merge them
+        in the sub-command order, so the result is the same as when running them one after another.
+        """
+        if not self.skip_build:
+            self.distribution.run_command("build")
+        # Run by both `install_scripts` and `install_egg_info`, which must not run it at the same time
+        self.distribution.run_command("egg_info")
+
+        cmd_names = [cmd_name for cmd_name in self.get_sub_commands() if cmd_name in PARALLEL_INSTALL_COMMANDS]
+        if len(cmd_names) < 2:
+            return
+        # Created and finalized on this thread, the distribution does not guard its command objects
+        for cmd_name in cmd_names:
+            self.get_finalized_command(cmd_name)
+
+        events = get_events(self)
+
+        def run(cmd_name):
+            with events.buffer() as buffered:
+                self.run_command(cmd_name)
+            return buffered
+
+        log.info("running %s using %d job(s)", ", ".join(cmd_names), min(jobs, len(cmd_names)))
+        with ThreadPoolExecutor(max_workers=min(jobs, len(cmd_names))) as executor:
+            self._buffered_events = dict(zip(cmd_names, executor.map(run, cmd_names)))
+
+    def run_command(self, command):
+        buffered = self._buffered_events.pop(command, None)
+        if buffered is not None:
+            get_events(self).replay(buffered)
+            return
+
+        with get_events(self).phase(command):
+            super().run_command(command)
+
+
+# `bdist_wheel` reinitializes the `install` command, which warns against `setup.py install` on every build. Filtered
+# once here rather than around each build, as `warnings.catch_warnings` is not safe with builds on several threads.
+warnings.filterwarnings("ignore", "setup.py install is deprecated", module="setuptools.command.install")
+
+
+_wheel_file_local = threading.local()
+
+
+class _MemberLogFilter(logging.Filter):
+    """Drops the per-member `adding '...'` messages of the `WheelFile` writes reported as events instead"""
+
+    def filter(self, record):
+        return not getattr(_wheel_file_local, "writing", False)
+
+
+class AxleWheelFile(WheelFile):
+    """A `WheelFile` reporting the members it writes as `MEMBER_WRITTEN` events rather than logging them one by one.
+
+    Unless given, the events are those of the axle archived by `bdist_wheel` on the current thread, see `archiving`.
+    Without any it is a plain `WheelFile`.
+    """
+
+    def __init__(self, file, mode="r", compression=zipfile.ZIP_DEFLATED, events=None):
+        super().__init__(file, mode, compression)
+        self.events = events if events is not None else getattr(_wheel_file_local, "events", None)
+
+    def writestr(self, zinfo_or_arcname, data, compress_type=None):
+        if self.events is None:
+            return super().writestr(zinfo_or_arcname, data, compress_type)
+
+        _wheel_file_local.writing = True
+        try:
+            super().writestr(zinfo_or_arcname, data, compress_type)
+        finally:
+            _wheel_file_local.writing = False
+        info = self.filelist[-1]
+        self.events.emit(MEMBER_WRITTEN, info.filename, info.file_size, info.compress_size)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def archiving(events):
+        """Makes the `WheelFile` created by `bdist_wheel` on the current thread report its members to `events`"""
+        _wheel_file_local.events = events
+        try:
+            yield
+        finally:
+            _wheel_file_local.events = None
+
+
+_wheel_file_lock = threading.Lock()
+_wheel_file_users = 0
+_member_log_filter = _MemberLogFilter()
+
 
 @contextlib.contextmanager
-def suppress_known_deprecation():
-    with warnings.catch_warnings():
-        warnings.filterwarnings("ignore", "setup.py install is deprecated")
+def _axle_wheel_files():
+    """Makes `bdist_wheel` archive with `AxleWheelFile` and drops the member messages it reports meanwhile.
+
+    `bdist_wheel` looks its archive writer up when writing. The first of the builds running at once on several threads
+    swaps it and adds the log filter, the last one out restores both. In between a plain `bdist_wheel` on another
+    thread is unaffected: outside of `archiving` an `AxleWheelFile` is a plain `WheelFile`, and the filter lets its
+    messages through.
+    """
+    global _wheel_file_users
+    module = sys.modules[_bdist_wheel.__module__]
+    wheel_file_log = getattr(sys.modules[WheelFile.__module__], "log", None)
+    with _wheel_file_lock:
+        if not _wheel_file_users:
+            module.WheelFile = AxleWheelFile
+            if isinstance(wheel_file_log, logging.Logger):
+                wheel_file_log.addFilter(_member_log_filter)
+        _wheel_file_users += 1
+    try:
         yield
+    finally:
+        with _wheel_file_lock:
+            _wheel_file_users -= 1
+            if not _wheel_file_users:
+                module.WheelFile = WheelFile
+                if isinstance(wheel_file_log, logging.Logger):
+                    wheel_file_log.removeFilter(_member_log_filter)
+
+
+class DataWheelFile(AxleWheelFile):
+    """A `WheelFile` dating the members it generates itself (the RECORD) at `timestamp` instead of the current time"""
+
+    def __init__(self, file, mode, compression, timestamp, events=None):
+        super().__init__(file, mode, compression, events)
+        timestamp = int(os.environ.get("SOURCE_DATE_EPOCH", timestamp))
+        self._date_time = time.gmtime(max(timestamp, ZIP_MINIMUM_TIMESTAMP))[:6]
+
+    def writestr(self, zinfo_or_arcname, data, compress_type=None):
+        if isinstance(zinfo_or_arcname, str):
+            zinfo_or_arcname = zipfile.ZipInfo(zinfo_or_arcname, date_time=self._date_time)
+            zinfo_or_arcname.compress_type = self.compression
+            zinfo_or_arcname.external_attr = (0o664 | stat.S_IFREG) << 16
+        super().writestr(zinfo_or_arcname, data, compress_type)
 
 
 class BdistAxle(_bdist_wheel):
@@ -324,13 +561,83 @@ class BdistAxle(_bdist_wheel):
                       "(default: None)"),
                      ("require-libpython=", None,
                       "set to indicate the package requires libpython in the exec_prefix/platlib",
-                      "(default: False)")
+                      "(default: False)"),
+                     ("split-debug-info", None,
+                      "split the debug info of the bundled ELF files into a separate archive "
+                      "and strip the shipped copies (default: False)"),
+                     ("debug-info-dir=", None,
+                      "directory to put the split debug info archive in "
+                      "(default: dist-dir)"),
+                     ("jobs=", "j",
+                      "number of parallel jobs "
+                      "(default: number of CPUs)"),
+                     ("elf-index", None,
+                      "write an index of the sonames, needed libraries and RPATH/RUNPATH of the bundled ELF files "
+                      "and fail if a needed library is missing (default: False)"),
+                     ("elf-external-libs=", None,
+                      "comma-separated glob patterns of the needed libraries expected to be provided "
+                      "by the target system in addition to the manylinux ones (default: None)"),
+                     ("content-index", None,
+                      "write the content hash and size of every member, and the symlinks, into an index an installer "
+                      "can compare against to only update the members changed (default: False)"),
+                     ("compile-bytecode", None,
+                      "precompile hash-based .pyc files of the packaged modules for the target interpreter "
+                      "(default: False)"),
+                     ("plan", None,
+                      "write a JSON plan of the wheel members, symlinks, tag and size estimates into the dist-dir "
+                      "without building or copying anything (default: False)"),
+                     ("metadata-only", None,
+                      "write the complete .dist-info of the wheel, including its symlinks, into the dist-dir "
+                      "without building or copying anything (default: False)"),
+                     ("watch", None,
+                      "keep the bdist-dir after the build and restage the changed sources, package data and data "
+                      "files into it and rewrite the wheel until interrupted, implies -k (default: False)"),
+                     ("watch-poll-interval=", None,
+                      "poll the watched directories every this many seconds instead of using inotify "
+                      "(default: inotify where available, 1.0 otherwise)"),
+                     ("skip-unchanged", None,
+                      "record the fingerprint of the build inputs and skip the build if the dist-dir already "
+                      "holds a wheel built from the same inputs (default: False)"),
+                     ("data-wheel-patterns=", None,
+                      "comma-separated glob patterns of the wheel paths to move into companion data wheels "
+                      "(default: None)"),
+                     ("data-wheel-threshold=", None,
+                      "move the files of at least this many bytes into companion data wheels (default: None)"),
+                     ("data-wheels=", None,
+                      "number of companion data wheels to spread the moved files over "
+                      "(default: 1 with --data-wheel-patterns or --data-wheel-threshold)"),
+                     ("data-wheel-version=", None,
+                      "version of the companion data wheels the wheel depends on "
+                      "(default: the project version)"),
+                     ("parallel-install", None,
+                      "run install_lib, install_headers, install_scripts and install_data concurrently on up to "
+                      "--jobs threads (default: False)"),
+                     ("layout", None,
+                      "lay the wheel out for installation: .dist-info first, then the members ordered by install "
+                      "directory (default: False)"),
+                     ("store-patterns=", None,
+                      "comma-separated glob patterns of the wheel paths to store uncompressed and page-aligned, "
+                      "implies --layout (default: None)"),
+                     ("store-threshold=", None,
+                      "store the members of at least this many bytes uncompressed and page-aligned, "
+                      "implies --layout (default: None)"),
+                     ("store-alignment=", None,
+                      "alignment of the data of the stored members (default: 4096)"),
                      ]
 
     boolean_options = list(_bdist_wheel.boolean_options)
-    boolean_options += ["root-is-pure", "require-libpython"]
-
-    AXLE_PTH_CONTENTS = """import wheel_axle.runtime; wheel_axle.runtime.finalize(fullname);"""
+    boolean_options += ["root-is-pure", "require-libpython", "split-debug-info", "elf-index", "content-index",
+                        "compile-bytecode",
+                        "plan", "metadata-only", "watch", "skip-unchanged", "parallel-install", "layout"]
+
+    # Nothing to do when the distribution is gone or its lock is not writable by this process (e.g. a read-only
+    # site-packages), which a single `access` call tells, or when it is finalized but its `.pth` could not be removed,
+    # which a `stat` of `axle.done` tells: bail out before `wheel_axle.runtime` is ever imported.
+    # Must remain a single `import` line without path separators, see `Install._restore_install_lib`.
+    AXLE_PTH_CONTENTS = ("import os; "
+                         f"os.access(os.path.join(fullname[:-4] + '.dist-info', '{AXLE_LOCK_FILE}'), os.W_OK) and "
+                         f"not os.path.exists(os.path.join(fullname[:-4] + '.dist-info', '{AXLE_DONE_FILE}')) and "
+                         "__import__('wheel_axle.runtime').runtime.finalize(fullname);")
 
     def initialize_options(self):
         super().initialize_options()
@@ -339,6 +646,38 @@ class BdistAxle(_bdist_wheel):
         self.python_tag = None
         self.python_tag_supplied = False
         self.require_libpython = False
+        self.split_debug_info = False
+        self.debug_info_dir = None
+        self.jobs = None
+        self.elf_index = False
+        self.content_index = False
+        self.elf_external_libs = None
+        self.compile_bytecode = False
+        self.plan = False
+        self.metadata_only = False
+        self.watch = False
+        self.watch_poll_interval = None
+        self.skip_unchanged = False
+        self.data_wheel_patterns = None
+        self.data_wheel_threshold = None
+        self.data_wheels = None
+        self.data_wheel_version = None
+        self.parallel_install = False
+        self.layout = False
+        self.store_patterns = None
+        self.store_threshold = None
+        self.store_alignment = None
+        self._fingerprint = None
+        self._data_wheel_timestamps = None
+        self.events = AxleEvents()
+        self.events.add_hook(SummaryLogHook())
+
+    def add_event_hook(self, hook):
+        """Registers `hook` to be called as `hook(event, *args)` for every build event.
+
+        See `wheel_axle.bdist_axle._events` for the events and their arguments.
+        """
+        self.events.add_hook(hook)
 
     def finalize_options(self):
         root_is_pure_supplied = self.root_is_pure is not None
@@ -354,6 +693,61 @@ class BdistAxle(_bdist_wheel):
         if root_is_pure_supplied:
             self.root_is_pure = bool(root_is_pure)
 
+        if self.debug_info_dir is None:
+            self.debug_info_dir = self.dist_dir
+
+        self.jobs = int(self.jobs) if self.jobs else (os.cpu_count() or 1)
+
+        external_libs = list(ELF_EXTERNAL_LIBS)
+        if self.elf_external_libs:
+            external_libs.extend(p.strip() for p in self.elf_external_libs.split(",") if p.strip())
+        self.elf_external_libs = external_libs
+
+        if self.data_wheel_patterns:
+            self.data_wheel_patterns = [p.strip() for p in self.data_wheel_patterns.split(",") if p.strip()]
+        else:
+            self.data_wheel_patterns = []
+        self.data_wheel_threshold = int(self.data_wheel_threshold) if self.data_wheel_threshold else None
+        splits_data = bool(self.data_wheel_patterns) or self.data_wheel_threshold is not None
+        if self.data_wheels is None:
+            self.data_wheels = 1 if splits_data else 0
+        else:
+            self.data_wheels = int(self.data_wheels)
+            if self.data_wheels and not splits_data:
+                raise DistutilsOptionError("--data-wheels requires --data-wheel-patterns or --data-wheel-threshold")
+        if self.data_wheels and self.relative:
+            raise DistutilsOptionError("companion data wheels cannot be built with --relative")
+        if self.data_wheel_version is None:
+            self.data_wheel_version = self.distribution.get_version()
+        for name in self.get_data_wheel_names():
+            self.distribution.install_requires.append(f"{name}=={self.data_wheel_version}")
+
+        if self.store_patterns:
+            self.store_patterns = [p.strip() for p in self.store_patterns.split(",") if p.strip()]
+        else:
+            self.store_patterns = []
+        self.store_threshold = int(self.store_threshold) if self.store_threshold else None
+        self.store_alignment = int(self.store_alignment) if self.store_alignment else 4096
+        if self.store_alignment & (self.store_alignment - 1) or not 0 < self.store_alignment <= 0x8000:
+            raise DistutilsOptionError("--store-alignment must be a power of 2 no greater than 32768")
+        if self.store_patterns or self.store_threshold is not None:
+            self.layout = True
+
+        self.watch_poll_interval = float(self.watch_poll_interval) if self.watch_poll_interval else None
+        if self.watch:
+            # Every other option changes the staged tree after the install, which is all that is restaged
+            unsupported = [option for option, value in (("--plan", self.plan), ("--metadata-only", self.metadata_only),
+                                                        ("--skip-unchanged", self.skip_unchanged),
+                                                        ("--split-debug-info", self.split_debug_info),
+                                                        ("--elf-index", self.elf_index),
+                                                        ("--content-index", self.content_index),
+                                                        ("--compile-bytecode", self.compile_bytecode),
+                                                        ("--data-wheels", self.data_wheels),
+                                                        ("--relative", self.relative)) if value]
+            if unsupported:
+                raise DistutilsOptionError(f"--watch cannot be combined with {', '.join(unsupported)}")
+            self.keep_temp = True
+
         if self.require_libpython:
             self.distribution.install_requires.append(WHEEL_AXLE_REQUIRE_LIBPYTHON_DEPENDENCY)
         else:
@@ -373,41 +767,857 @@ class BdistAxle(_bdist_wheel):
         return tag
 
     def run(self):
-        with suppress_known_deprecation():
-            def remove_patched_command_objs():
-                for k in patch_classes:
-                    if k in self.distribution.command_obj:
-                        del self.distribution.command_obj[k]
-
-            patch_classes = {"install_data": InstallData,
-                             "install_lib": InstallLib,
-                             "install_headers": InstallHeaders,
-                             "install_scripts": InstallScripts,
-                             "build_scripts": BuildScripts,
-                             "build_py": BuildPy,
-                             "egg_info": EggInfo,
-                             "install": Install}
-
-            old_cmdclass = dict(self.distribution.cmdclass)
-            self.distribution.cmdclass.update(patch_classes)
-
+        def remove_patched_command_objs():
+            for k in patch_classes:
+                if k in self.distribution.command_obj:
+                    del self.distribution.command_obj[k]
+
+        patch_classes = {"install_data": InstallData,
+                         "install_lib": InstallLib,
+                         "install_headers": InstallHeaders,
+                         "install_scripts": InstallScripts,
+                         "build_scripts": BuildScripts,
+                         "build_py": BuildPy,
+                         "egg_info": EggInfo,
+                         "install": Install}
+
+        # Replaced rather than updated, the original may be shared with other distributions
+        old_cmdclass = self.distribution.cmdclass
+        self.distribution.cmdclass = dict(old_cmdclass, **patch_classes)
+        self.distribution.axle_events = self.events
+        self.distribution.axle_paths = PathStore()
+        self.distribution.axle_install_jobs = self.jobs if self.parallel_install else 1
+
+        remove_patched_command_objs()
+        try:
+            with self.events.phase("bdist_axle"):
+                if self.plan:
+                    self.write_plan()
+                elif self.metadata_only:
+                    self.write_metadata()
+                elif self.skip_unchanged and self.is_up_to_date():
+                    wheel_path = os.path.join(self.dist_dir, self.get_archive_basename() + ".whl")
+                    log.info("%s is up to date, skipping build", wheel_path)
+                    for path in [wheel_path] + self.get_data_wheel_paths():
+                        self.add_dist_file(path)
+                else:
+                    wheel_path = os.path.join(self.dist_dir, self.get_archive_basename() + ".whl")
+                    # The wheel, its companions and the watched rewrites are archived by `AxleWheelFile`
+                    with _axle_wheel_files():
+                        compression = self.compression
+                        if self.layout:
+                            # Archived as is only to be laid out and compressed once in `write_layout`
+                            self.compression = zipfile.ZIP_STORED
+                        try:
+                            # Laid out members are reported once rewritten
+                            with AxleWheelFile.archiving(NO_EVENTS if self.layout else self.events):
+                                super().run()
+                        finally:
+                            self.compression = compression
+                        if self.layout:
+                            self.write_layout(wheel_path)
+                        if self.data_wheels:
+                            self.write_data_wheels()
+                        if self.skip_unchanged:
+                            self.write_fingerprint()
+                        if self.watch:
+                            self.watch_sources(wheel_path)
+        finally:
+            self.distribution.cmdclass = old_cmdclass
+            del self.distribution.axle_events
+            del self.distribution.axle_paths
+            del self.distribution.axle_install_jobs
             remove_patched_command_objs()
+
+    def run_command(self, command):
+        with self.events.phase(command):
+            super().run_command(command)
+
+    def add_dist_file(self, wheel_path):
+        # Add to 'Distribution.dist_files' so that the "upload" command works
+        getattr(self.distribution, "dist_files", []).append(
+            ("bdist_wheel", "{}.{}".format(*sys.version_info[:2]), wheel_path))
+
+    def get_archive_basename(self):
+        impl_tag, abi_tag, plat_tag = self.get_tag()
+        return f"{self.wheel_dist_name}-{impl_tag}-{abi_tag}-{plat_tag}"
+
+    def get_distinfo_dirname(self):
+        return f"{safer_name(self.distribution.get_name())}-{safer_version(self.distribution.get_version())}.dist-info"
+
+    def get_fingerprint_inputs(self):
+        """Returns the sorted paths of every file the wheel is built from"""
+        setup_dir = os.path.dirname(os.path.abspath(self.distribution.script_name or "setup.py"))
+        inputs = {os.path.join(setup_dir, name) for name in ("setup.py", "setup.cfg", "pyproject.toml", "MANIFEST.in")
+                  if os.path.exists(os.path.join(setup_dir, name))}
+        inputs.update(source for _, source in self.get_plan_sources() if source is not None)
+        for ext in self.distribution.ext_modules or ():
+            inputs.update(ext.sources)
+            inputs.update(ext.depends or ())
+        for _, build_info in self.distribution.libraries or ():
+            inputs.update(build_info.get("sources", ()))
+        return sorted(inputs)
+
+    def get_fingerprint_seed(self):
+        """Returns the option values, requirements and tag of the build as a string"""
+        options = {}
+        for option in self.user_options:
+            name = option[0].rstrip("=").replace("-", "_")
+            if name not in FINGERPRINT_IGNORED_OPTIONS:
+                options[name] = getattr(self, name, None)
+        return json.dumps({"bdist_axle": __version__,
+                           "tag": self.get_tag(),
+                           "install_requires": self.distribution.install_requires,
+                           "options": options}, sort_keys=True, default=str)
+
+    def get_fingerprint_path(self):
+        """Returns the path the fingerprint of the last build is kept at, outside of the dist-dir"""
+        bdist_base = self.get_finalized_command("bdist").bdist_base
+        return os.path.join(bdist_base, self.get_archive_basename() + ".fingerprint")
+
+    def get_output_stats(self):
+        """Returns the `[path, size, mtime]` of the wheels in the dist-dir the build writes, None if any is missing"""
+        output_stats = []
+        for path in [os.path.join(self.dist_dir, self.get_archive_basename() + ".whl")] + self.get_data_wheel_paths():
             try:
-                super().run()
-            finally:
-                self.distribution.cmdclass = old_cmdclass
-                remove_patched_command_objs()
+                st = os.stat(path)
+            except OSError:
+                return None
+            output_stats.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+        return output_stats
+
+    def is_up_to_date(self):
+        """Fingerprints the build inputs and checks them against the wheel in the dist-dir.
+
+        A matching `stat` fingerprint of the last build is trusted as is as long as the wheels in the dist-dir are
+        still the ones it wrote, otherwise the content fingerprint is confirmed against the one recorded in the
+        wheel itself.
+        """
+        self.run_command("egg_info")
+        inputs = self.get_fingerprint_inputs()
+        seed = self.get_fingerprint_seed()
+        self._fingerprint = {"stat": stat_digest(inputs, seed), "content": None}
 
-    def egg2dist(self, egginfo_path, distinfo_path):
-        super().egg2dist(egginfo_path, distinfo_path)
+        output_stats = self.get_output_stats()
+        if output_stats is None:
+            return False
 
-        install_cmd = self.get_finalized_command("install")
+        try:
+            with open(self.get_fingerprint_path()) as f:
+                last = json.load(f)
+            if last["stat"] == self._fingerprint["stat"] and last["outputs"] == output_stats:
+                return True
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self._fingerprint["content"] = content_digest(inputs, seed)
+        distinfo_dirname = self.get_distinfo_dirname()
+        try:
+            with zipfile.ZipFile(output_stats[0][0]) as zf:
+                recorded = zf.read(f"{distinfo_dirname}/{FINGERPRINT_FILE}").decode("utf-8").strip()
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return False
+
+        if recorded != self._fingerprint["content"]:
+            return False
+
+        self.write_fingerprint()
+        return True
+
+    def write_fingerprint(self):
+        fingerprint_path = self.get_fingerprint_path()
+        self.mkpath(os.path.dirname(fingerprint_path))
+        with open(fingerprint_path, "w") as f:
+            json.dump(dict(self._fingerprint, outputs=self.get_output_stats()), f)
+
+    def get_lib_prefix(self):
+        """Returns the wheel path prefix `install_lib` stages the modules and the `.pth` file under"""
+        root_key = "purelib" if self.root_is_pure else "platlib"
+        lib_key = "platlib" if self.distribution.has_ext_modules() else "purelib"
+        return "" if lib_key == root_key else f"{self.data_dir}/{lib_key}/"
+
+    def get_plan_sources(self, built=False):
+        """Yields the `(wheel path, source path)` of every file the build would stage, without building anything.
+
+        The source path is None for the files that only exist once built, i.e. extension modules, unless `built`
+        where it is their build output.
+        """
+        lib_prefix = self.get_lib_prefix()
+
+        def rel(path, base):
+            return os.path.relpath(path, base).replace(os.path.sep, "/")
+
+        build_py = self.get_finalized_command("build_py")
+        for package, module, module_file in build_py.find_all_modules():
+            outfile = build_py.get_module_outfile(build_py.build_lib, package.split("."), module)
+            yield lib_prefix + rel(outfile, build_py.build_lib), module_file
+        for package, src_dir, build_dir, filenames in build_py.data_files:
+            for filename in filenames:
+                yield (lib_prefix + rel(os.path.join(build_dir, filename), build_py.build_lib),
+                       os.path.join(src_dir, filename))
+
+        if self.distribution.has_ext_modules():
+            build_ext = self.get_finalized_command("build_ext")
+            for outfile in build_ext.get_outputs():
+                yield lib_prefix + rel(outfile, build_ext.build_lib), outfile if built else None
+
+        for script in self.distribution.scripts or ():
+            script = convert_path(script)
+            yield f"{self.data_dir}/scripts/{os.path.basename(script)}", script
+
+        for header in self.distribution.headers or ():
+            header = convert_path(header)
+            yield f"{self.data_dir}/headers/{os.path.basename(header)}", header
+
+        for data_file in self.distribution.data_files or ():
+            if isinstance(data_file, str):
+                data_dir, data_files = "", [data_file]
+            else:
+                data_dir, data_files = data_file
+            data_dir = convert_path(data_dir).strip(os.path.sep)
+            for f in data_files:
+                f = convert_path(f)
+                yield "/".join(filter(None, (f"{self.data_dir}/data", data_dir.replace(os.path.sep, "/"),
+                                             os.path.basename(f)))), f
+
+    def scan_plan_sources(self):
+        """Splits the files the build would stage into `(wheel path, source path)` files and
+        `(wheel path, link destination, is directory)` symlinks, without building anything"""
+        files = []
+        symlinks = []
+        seen = set()
+        for path, source in self.get_plan_sources():
+            if path in seen:
+                continue
+            seen.add(path)
+
+            if source is not None and os.path.islink(source):
+                link_dest = os.readlink(source)
+                link_dest_isdir = os.path.isdir(os.path.join(os.path.dirname(source), link_dest))
+                symlinks.append((path, link_dest, link_dest_isdir))
+            else:
+                files.append((path, source))
+        return files, symlinks
+
+    def get_plan(self):
+        """Computes the wheel layout, symlink table, tag and size estimates without staging any files"""
+        self.run_command("egg_info")
+
+        impl_tag, abi_tag, plat_tag = self.get_tag()
+        members = []
+        files, symlinks = self.scan_plan_sources()
+        for path, source in files:
+            size = compressed_size = None
+            if source is not None:
+                size = os.stat(source).st_size
+                compressed_size = estimate_compressed_size(source, size)
+            members.append({"path": path, "source": source, "size": size, "compressed_size": compressed_size})
+
+        # `install` writes the `.pth` file as a line of its own
+        pth_size = len(self.AXLE_PTH_CONTENTS) + 1
+        members.append({"path": f"{self.get_lib_prefix()}{self.wheel_dist_name}.pth", "source": None,
+                        "size": pth_size, "compressed_size": pth_size})
+
+        distinfo_dirname = self.get_distinfo_dirname()
+        egg_info = self.get_finalized_command("egg_info").egg_info
+        distinfo_sources = []
+        for name in sorted(os.listdir(egg_info)):
+            path = os.path.join(egg_info, name)
+            if name in ("PKG-INFO", "requires.txt", "SOURCES.txt", "not-zip-safe"):
+                continue
+            if name == "dependency_links.txt":
+                with open(path) as f:
+                    if not f.read().strip():
+                        continue
+            distinfo_sources.append((name, path))
+        distinfo_sources.extend((os.path.basename(path), path) for path in getattr(self, "license_paths", ()))
+        distinfo_sources.extend((name, None) for name in
+                                ("METADATA", "WHEEL", SYMLINKS_FILE, AXLE_LOCK_FILE) +
+                                ((REQUIRE_LIBPYTHON_FILE,) if self.require_libpython else ()) +
+                                ((ELF_INDEX_FILE,) if self.elf_index else ()) +
+                                ((CONTENT_INDEX_FILE,) if self.content_index else ()) + ("RECORD",))
+        for name, source in distinfo_sources:
+            size = os.path.getsize(source) if source else None
+            members.append({"path": f"{distinfo_dirname}/{name}", "source": source, "size": size,
+                            "compressed_size": size})
+
+        size = sum(m["size"] or 0 for m in members)
+        compressed_size = sum((m["compressed_size"] or 0) + ZIP_MEMBER_OVERHEAD + 2 * len(m["path"].encode())
+                              for m in members)
+        # RECORD holds a path, an SHA-256 digest and a size per member
+        compressed_size += sum(len(m["path"].encode()) + 60 for m in members) // 2
+
+        return {"wheel": f"{self.wheel_dist_name}-{impl_tag}-{abi_tag}-{plat_tag}.whl",
+                "tag": [impl_tag, abi_tag, plat_tag],
+                "root_is_pure": bool(self.root_is_pure),
+                "members": members,
+                "symlinks": [list(symlink) for symlink in symlinks],
+                "size": size,
+                "estimated_compressed_size": compressed_size}
+
+    def write_plan(self):
+        plan = self.get_plan()
+        plan_path = os.path.join(self.dist_dir, self.get_archive_basename() + ".plan.json")
+
+        self.mkpath(self.dist_dir)
+        log.info("writing plan of %d member(s) and %d symlink(s) to %s", len(plan["members"]),
+                 len(plan["symlinks"]), plan_path)
+        with open(plan_path, "w") as f:
+            json.dump(plan, f, indent=1)
+
+    def get_native_outputs(self):
+        """Returns the ELF files staged by the `install_lib` (including `build_py`) and `install_data`"""
+        outputs = []
+        for cmd_name in ("install_lib", "install_data"):
+            cmd = self.get_finalized_command(cmd_name)
+            for output in cmd.get_outputs():
+                if output not in outputs and is_elf_file(output):
+                    outputs.append(output)
+        return outputs
+
+    def split_native_debug_info(self):
+        """Splits the debug info of the staged ELF files into a `.debug.zip` archive next to the wheel"""
+        elf_files = self.get_native_outputs()
+        if not elf_files:
+            log.info("no ELF files found, skipping debug info split")
+            return
+
+        debug_archive = os.path.join(self.debug_info_dir, self.get_archive_basename() + ".debug.zip")
+        debug_dir = self.bdist_dir + ".debug"
+        if os.path.exists(debug_dir):
+            remove_tree(debug_dir, dry_run=self.dry_run)
+        objcopy = os.environ.get("OBJCOPY", "objcopy")
+
+        def split(elf_file):
+            debug_file = os.path.join(debug_dir, os.path.relpath(elf_file, self.bdist_dir) + ".debug")
+            return debug_file, split_debug_info(elf_file, debug_file, objcopy)
+
+        log.info("splitting debug info from %d ELF file(s) using %d job(s)", len(elf_files), self.jobs)
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            results = list(executor.map(split, elf_files))
+
+        self.mkpath(self.debug_info_dir)
+        with zipfile.ZipFile(debug_archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for debug_file, _ in results:
+                zf.write(debug_file, os.path.relpath(debug_file, debug_dir))
+        remove_tree(debug_dir, dry_run=self.dry_run)
+
+        size = sum(r[1][0] for r in results)
+        stripped_size = sum(r[1][1] for r in results)
+        log.info("stripped %d ELF file(s): %d -> %d bytes (%.1f%% reduction), debug info written to %s",
+                 len(results), size, stripped_size,
+                 100.0 * (size - stripped_size) / size if size else 0.0,
+                 debug_archive)
+
+    def write_elf_index(self, index_path, symlinks):
+        """Scans the staged ELF files and writes their dynamic linking info into the index.
+
+        Each `DT_NEEDED` entry is resolved against the staged files and `symlinks` first via `$ORIGIN`-relative
+        RPATH/RUNPATH entries and then by name anywhere in the wheel.
+        """
+        files = set()
+        for root, dirs, filenames in os.walk(self.bdist_dir):
+            dirs.sort()
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if not os.path.islink(path):
+                    files.add(os.path.relpath(path, self.bdist_dir).replace(os.path.sep, "/"))
+
+        links = {symlink[0].replace(os.path.sep, "/"): symlink[1] for symlink in symlinks}
+        by_name = {}
+        for path in itertools.chain(sorted(files), sorted(links)):
+            by_name.setdefault(path.rsplit("/", 1)[-1], path)
+
+        def is_satisfied(path):
+            for _ in range(40):
+                if path in files:
+                    return True
+                if path not in links:
+                    return False
+                link_dest = links[path]
+                if os.path.isabs(link_dest):
+                    return True
+                path = os.path.normpath(os.path.join(os.path.dirname(path), link_dest)).replace(os.path.sep, "/")
+            return False
+
+        def resolve(path, info, needed):
+            if "/" in needed:
+                candidates = [needed]
+            else:
+                origin = os.path.dirname(path)
+                search_path = info["runpath"] or info["rpath"]
+                candidates = []
+                for entry in search_path:
+                    entry = entry.replace("${ORIGIN}", "$ORIGIN")
+                    if entry.startswith("$ORIGIN"):
+                        entry = os.path.normpath(os.path.join(origin, entry[len("$ORIGIN"):].lstrip("/"), needed))
+                        candidates.append(entry.replace(os.path.sep, "/"))
+                if needed in by_name:
+                    candidates.append(by_name[needed])
+
+            for candidate in candidates:
+                if is_satisfied(candidate):
+                    return candidate
+            return None
+
+        def scan(path):
+            return path, read_elf_dynamic(os.path.join(self.bdist_dir, path))
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            scanned = [(path, info) for path, info in executor.map(scan, sorted(files)) if info is not None]
+
+        sonames = {}
+        libraries = {}
+        missing = []
+        for path, info in scanned:
+            if info["soname"]:
+                sonames.setdefault(info["soname"], []).append(path)
+            resolved = {}
+            for needed in info["needed"]:
+                resolved[needed] = resolve(path, info, needed)
+                if resolved[needed] is None and not any(fnmatch.fnmatchcase(needed, pattern)
+                                                        for pattern in self.elf_external_libs):
+                    missing.append((path, needed))
+            libraries[path] = dict(info, resolved=resolved)
+
+        if missing:
+            raise DistutilsFileError("needed libraries not found in the wheel:\n" +
+                                     "\n".join("  %s: %s" % m for m in missing))
+
+        log.info("writing ELF index of %d file(s) to %s", len(libraries), index_path)
+        with open(index_path, "w") as f:
+            json.dump({"version": 1, "sonames": sonames, "libraries": libraries}, f, indent=1, sort_keys=True)
+
+    def write_content_index(self, index_path, root, symlinks):
+        """Hashes the files staged under `root` using `jobs` threads and writes their hash and size into the index,
+        along with the `symlinks` as links.
+
+        The `.dist-info` is left out, as the index can cover neither itself nor the RECORD and WHEEL written after it.
+        """
+        files = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            if dirpath == root:
+                dirnames[:] = [name for name in dirnames if not name.endswith(".dist-info")]
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if not os.path.islink(path):
+                    files.append(path)
+
+        members = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for path, (digest, size) in zip(files, executor.map(content_hash, files)):
+                members[os.path.relpath(path, root).replace(os.path.sep, "/")] = {"hash": digest, "size": size}
+        for path, link_dest, link_dest_isdir in symlinks:
+            members[path.replace(os.path.sep, "/")] = {"link": link_dest.replace(os.path.sep, "/"),
+                                                       "isdir": bool(link_dest_isdir)}
+
+        log.info("writing content index of %d member(s) to %s", len(members), index_path)
+        with open(index_path, "w") as f:
+            json.dump({"version": 1, "algorithm": CONTENT_HASH_ALGORITHM, "members": members}, f, indent=1,
+                      sort_keys=True)
+
+    def byte_compile_modules(self):
+        """Precompiles the staged Python modules into hash-based `.pyc` files using `jobs` `compileall` processes.
+
+        Bytecode can only be produced for the running interpreter, so its tag must match the wheel's python tag.
+        """
+        impl_tag = self.get_tag()[0]
+        interpreter = tags.interpreter_name() + tags.interpreter_version()
+        if not any(t in ("py3", f"py{tags.interpreter_version()}", interpreter) for t in impl_tag.split(".")):
+            raise DistutilsOptionError(f"cannot compile bytecode for python tag {impl_tag!r} "
+                                       f"with the running interpreter {interpreter!r}")
+
+        install_lib = self.get_finalized_command("install_lib")
+        sources = sorted(set(f for f in install_lib.get_outputs()
+                             if f.endswith(".py") and os.path.isfile(f) and not os.path.islink(f)))
+        if not sources:
+            return
+
+        log.info("compiling %d module(s) to bytecode for %s using %d job(s)", len(sources), interpreter, self.jobs)
+        if self.jobs > 1:
+            chunks = [sources[idx::self.jobs] for idx in range(min(self.jobs, len(sources)))]
+            with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+                list(executor.map(lambda chunk: byte_compile_files(chunk, self.bdist_dir), chunks))
+        else:
+            dfiles = [os.path.relpath(f, self.bdist_dir) for f in sources]
+            list(map(byte_compile_file, sources, dfiles))
+
+    def get_data_wheel_names(self):
+        """Returns the project names of the companion data wheels"""
+        name = self.distribution.get_name() + "-data"
+        if self.data_wheels == 1:
+            return [name]
+        return [f"{name}-{idx}" for idx in range(self.data_wheels)]
+
+    def get_data_wheel_dist_names(self):
+        return [f"{safer_name(name)}-{safer_version(self.data_wheel_version)}" for name in self.get_data_wheel_names()]
+
+    def get_data_wheel_paths(self):
+        impl_tag, abi_tag, plat_tag = self.get_tag()
+        return [os.path.join(self.dist_dir, f"{dist_name}-{impl_tag}-{abi_tag}-{plat_tag}.whl")
+                for dist_name in self.get_data_wheel_dist_names()]
+
+    def get_data_wheel_index(self, path, size=None):
+        """Returns the index of the companion data wheel owning the wheel `path`, None if it stays in the wheel.
+
+        A path is moved if it matches a pattern or, given its `size`, reaches the threshold. The companion is picked
+        by the hash of the path alone, so that adding or changing a file leaves the other companions unchanged.
+        The headers never move, as pip installs them into a directory named after the distribution owning them.
+        """
+        if path.startswith(f"{self.data_dir}/headers/"):
+            return None
+        if not (any(fnmatch.fnmatchcase(path, pattern) for pattern in self.data_wheel_patterns) or
+                size is not None and self.data_wheel_threshold is not None and size >= self.data_wheel_threshold):
+            return None
+        return zlib.crc32(path.encode("utf-8")) % self.data_wheels
+
+    def route_data_wheel_symlinks(self, owners, symlinks):
+        """Returns the `{wheel path: index of the companion data wheel or None}` of the `symlinks` to place.
+
+        `owners` maps the wheel path of every file to the index of its companion, None if it stays in the wheel. A
+        symlink goes along with the file, directory or symlink it points to within the wheel, so that it resolves once
+        the wheels are installed, and by its own path otherwise. A symlink to a directory split across several wheels
+        cannot be placed and fails the build.
+        """
+        links = {symlink[0].replace(os.path.sep, "/"): symlink[1] for symlink in symlinks}
+        routes = {}
+
+        def route(path, seen):
+            if path in routes:
+                return routes[path]
+            idx = self.get_data_wheel_index(path)
+            link_dest = links[path].replace(os.path.sep, "/")
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(path), link_dest))
+            if not posixpath.isabs(link_dest) and target != os.curdir and not target.startswith("../"):
+                seen = seen | {path}
+                if target in links:
+                    if target not in seen:
+                        idx = route(target, seen)
+                elif target in owners:
+                    idx = owners[target]
+                else:
+                    prefix = target + "/"
+                    dir_owners = {owner for owned, owner in owners.items() if owned.startswith(prefix)}
+                    dir_owners.update(route(link, seen) for link in links
+                                      if link.startswith(prefix) and link not in seen)
+                    if len(dir_owners) > 1:
+                        raise DistutilsOptionError(f"symlink {path!r} points to {target!r}, which is split across "
+                                                   "several wheels by the data wheel options")
+                    if dir_owners:
+                        idx = dir_owners.pop()
+            routes[path] = idx
+            return idx
+
+        for path in links:
+            route(path, frozenset())
+        return routes
+
+    def split_data_wheels(self, symlinks):
+        """Moves the files owned by the companion data wheels out of the bdist-dir and writes their dist-infos.
+
+        Returns the `symlinks` staying in the wheel, the others are routed to the `symlinks.txt` of the companion
+        owning their target, see `route_data_wheel_symlinks`.
+        """
+        dist_names = self.get_data_wheel_dist_names()
+        data_dirs = [self.bdist_dir + "." + dist_name for dist_name in dist_names]
+        for data_dir in data_dirs:
+            if os.path.exists(data_dir):
+                remove_tree(data_dir, dry_run=self.dry_run)
+
+        def data_wheel_path(path, idx):
+            # The contents of the `.data` directory move into the `.data` directory of the companion
+            if path.startswith(self.data_dir + "/"):
+                return dist_names[idx] + ".data" + path[len(self.data_dir):]
+            return path
+
+        pth_path = self.get_lib_prefix() + self.wheel_dist_name + ".pth"
+        timestamps = [ZIP_MINIMUM_TIMESTAMP] * len(data_dirs)
+        counts = [0] * len(data_dirs)
+        sizes = [0] * len(data_dirs)
+        owners = {}
+        for root, dirnames, filenames in os.walk(self.bdist_dir):
+            base = os.path.relpath(root, self.bdist_dir)
+            if base == os.curdir:
+                dirnames[:] = [name for name in dirnames if not name.endswith(".dist-info")]
+                base = ""
+            for filename in filenames:
+                src = os.path.join(root, filename)
+                path = os.path.join(base, filename).replace(os.path.sep, "/")
+                st = os.lstat(src)
+                idx = owners[path] = None if path == pth_path else self.get_data_wheel_index(path, st.st_size)
+                if idx is None:
+                    continue
+                dst = os.path.join(data_dirs[idx], data_wheel_path(path, idx))
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                os.replace(src, dst)
+                timestamps[idx] = max(timestamps[idx], int(st.st_mtime))
+                counts[idx] += 1
+                sizes[idx] += st.st_size
+
+        symlinks = list(symlinks)
+        routes = self.route_data_wheel_symlinks(owners, symlinks)
+        wheel_symlinks = []
+        data_symlinks = [[] for _ in data_dirs]
+        for symlink in symlinks:
+            path = symlink[0].replace(os.path.sep, "/")
+            idx = routes[path]
+            if idx is None:
+                wheel_symlinks.append(symlink)
+            else:
+                data_symlinks[idx].append((data_wheel_path(path, idx), symlink[1], symlink[2]))
+
+        for idx, name in enumerate(self.get_data_wheel_names()):
+            log.info("moving %d file(s) (%d bytes) and %d symlink(s) into %s", counts[idx], sizes[idx],
+                     len(data_symlinks[idx]), name)
+            self.write_data_wheel_metadata(name, data_dirs[idx], dist_names[idx], data_symlinks[idx],
+                                           timestamps[idx])
+
+        self._data_wheel_timestamps = timestamps
+        return wheel_symlinks
+
+    def write_data_wheel_metadata(self, name, data_dir, dist_name, symlinks, timestamp):
+        """Writes the dist-info and the `.pth` file of a companion data wheel dated at `timestamp`"""
+        distinfo_path = os.path.join(data_dir, dist_name + ".dist-info")
+        self.mkpath(distinfo_path)
+
+        msg = Message()
+        msg["Metadata-Version"] = "2.1"
+        msg["Name"] = name
+        msg["Version"] = self.data_wheel_version
+        msg["Summary"] = f"Data files of {self.distribution.get_name()}"
+        msg["Description-Content-Type"] = "text/plain"
+        msg["Requires-Dist"] = WHEEL_AXLE_DEPENDENCY
+        msg.set_payload(f"Data files of {self.distribution.get_name()} split off into a separate wheel.\n")
+        with open(os.path.join(distinfo_path, "METADATA"), "wb") as f:
+            BytesGenerator(f, maxheaderlen=0).flatten(msg)
+
+        self.write_wheelfile(distinfo_path)
+        write_symlinks_file(os.path.join(distinfo_path, SYMLINKS_FILE), symlinks)
+        with open(os.path.join(distinfo_path, AXLE_LOCK_FILE), "wb"):
+            pass
+        with open(os.path.join(data_dir, dist_name + ".pth"), "w") as f:
+            f.write(self.AXLE_PTH_CONTENTS + "\n")
+        if self.content_index:
+            self.write_content_index(os.path.join(distinfo_path, CONTENT_INDEX_FILE), data_dir, symlinks)
+
+        # Generated files are dated like the payload so that an unchanged companion is written byte-identical
+        generated = [os.path.join(distinfo_path, filename) for filename in os.listdir(distinfo_path)]
+        generated.append(os.path.join(data_dir, dist_name + ".pth"))
+        for path in generated:
+            os.utime(path, (timestamp, timestamp))
+
+    def write_data_wheels(self):
+        """Archives the companion data wheels into the dist-dir in parallel"""
+        dist_names = self.get_data_wheel_dist_names()
+        data_dirs = [self.bdist_dir + "." + dist_name for dist_name in dist_names]
+        wheel_paths = self.get_data_wheel_paths()
+
+        def write(idx):
+            # Held back and reported one wheel after the other
+            with self.events.buffer() as buffered:
+                compression = zipfile.ZIP_STORED if self.layout else self.get_zip_compression()
+                with DataWheelFile(wheel_paths[idx], "w", compression, self._data_wheel_timestamps[idx],
+                                   NO_EVENTS if self.layout else self.events) as wf:
+                    wf.write_files(data_dirs[idx])
+                if self.layout:
+                    self.write_layout(wheel_paths[idx])
+            return buffered
+
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(wheel_paths))) as executor:
+            buffered = list(executor.map(write, range(len(wheel_paths))))
+
+        for wheel_path, events in zip(wheel_paths, buffered):
+            self.add_dist_file(wheel_path)
+            self.events.replay(events)
+
+        if not self.keep_temp:
+            for data_dir in data_dirs:
+                remove_tree(data_dir, dry_run=self.dry_run)
+
+    def get_layout_key(self, path):
+        """Sorts the `.dist-info` first (its RECORD last), then the members by scheme and install directory"""
+        top, _, rest = path.partition("/")
+        if top.endswith(".dist-info"):
+            return 0, "", rest == "RECORD", rest
+        if top.endswith(".data") and rest:
+            scheme, _, rest = rest.partition("/")
+            group = 2 + (LAYOUT_SCHEMES.index(scheme) if scheme in LAYOUT_SCHEMES else len(LAYOUT_SCHEMES))
+            directory, _, name = rest.rpartition("/")
+            return group, directory, False, name
+        directory, _, name = path.rpartition("/")
+        return 1, directory, False, name
+
+    def get_zip_compression(self):
+        """Returns the `zipfile` compression method of the `--compression` option.
+
+        `bdist_wheel` of setuptools keeps the option as given and converts it when archiving, older `wheel` releases
+        convert it while finalizing the options.
+        """
+        zip_compression = getattr(self, "_zip_compression", None)
+        return zip_compression() if zip_compression is not None else self.compression
 
-        symlinks = [(os.path.relpath(symlink[0], self.bdist_dir),
-                     symlink[1],
-                     symlink[2]) for symlink in install_cmd.get_symlinks()]
+    def is_stored(self, path, size):
+        """Returns True if the wheel `path` of `size` bytes is to be stored uncompressed and aligned"""
+        return (any(fnmatch.fnmatchcase(path, pattern) for pattern in self.store_patterns) or
+                self.store_threshold is not None and size >= self.store_threshold)
+
+    def write_layout(self, wheel_path):
+        """Rewrites the wheel at `wheel_path` with the members in install order, compressing or storing them.
+
+        The contents are unchanged, so the RECORD of the wheel remains valid and is copied as is.
+        """
+        layout_path = wheel_path + ".layout"
+        stored = 0
+        with zipfile.ZipFile(wheel_path) as src, zipfile.ZipFile(layout_path, "w", allowZip64=True) as dst:
+            for info in sorted(src.infolist(), key=lambda i: self.get_layout_key(i.filename)):
+                if self.is_stored(info.filename, info.file_size):
+                    zinfo = copy_member(src, info, dst, zipfile.ZIP_STORED, self.store_alignment)
+                    stored += 1
+                else:
+                    zinfo = copy_member(src, info, dst, self.get_zip_compression())
+                self.events.emit(MEMBER_WRITTEN, zinfo.filename, zinfo.file_size, zinfo.compress_size)
+        os.replace(layout_path, wheel_path)
+        log.info("laid out %s, storing %d member(s) aligned at %d bytes", wheel_path, stored, self.store_alignment)
+
+    def get_watch_sources(self):
+        """Returns the `{wheel path: absolute source path}` of the files staged from the project as it is now"""
+        # The manifest and the package data are found anew, so that the added files are picked up
+        for command in ("egg_info", "build_py"):
+            self.reinitialize_command(command)
+        self.run_command("egg_info")
+
+        sources = {}
+        for path, source in self.get_plan_sources(built=True):
+            if path not in sources:
+                sources[path] = os.path.abspath(source)
+        return sources
+
+    def get_watch_dirs(self, sources):
+        dirs = {os.path.dirname(source) for source in sources.values()}
+        build_py = self.get_finalized_command("build_py")
+        dirs.update(os.path.abspath(build_py.get_package_dir(package)) for package in build_py.packages or ())
+        return dirs
+
+    def watch_sources(self, wheel_path):
+        """Restages the changed sources into the kept bdist-dir and rewrites the wheel until interrupted"""
+        distinfo_path = os.path.join(self.bdist_dir, self.get_distinfo_dirname())
+        symlinks = {path.replace(os.path.sep, "/"): (link_dest, link_dest_isdir) for path, link_dest, link_dest_isdir
+                    in read_symlinks_file(os.path.join(distinfo_path, SYMLINKS_FILE))}
+        sources = self.get_watch_sources()
+
+        watcher = open_watcher(self.watch_poll_interval or 1.0, polling=self.watch_poll_interval is not None)
+        try:
+            while True:
+                watcher.watch(self.get_watch_dirs(sources))
+                log.info("watching %d file(s) for changes, interrupt to stop", len(sources))
+                changed = watcher.wait()
+
+                new_sources = self.get_watch_sources()
+                count = self.restage(sources, new_sources, changed, symlinks)
+                sources = new_sources
+                if not count:
+                    continue
+
+                with self.events.phase("bdist_axle"):
+                    write_symlinks_file(os.path.join(distinfo_path, SYMLINKS_FILE),
+                                        [(path, link_dest, link_dest_isdir)
+                                         for path, (link_dest, link_dest_isdir) in symlinks.items()])
+                    with AxleWheelFile(wheel_path, "w",
+                                       zipfile.ZIP_STORED if self.layout else self.get_zip_compression(),
+                                       NO_EVENTS if self.layout else self.events) as wf:
+                        wf.write_files(self.bdist_dir)
+                    if self.layout:
+                        self.write_layout(wheel_path)
+                log.info("restaged %d path(s) and rewrote %s", count, wheel_path)
+        except KeyboardInterrupt:
+            log.info("stopped watching")
+        finally:
+            watcher.close()
+
+    def restage(self, old_sources, sources, changed, symlinks):
+        """Brings the bdist-dir and the `symlinks` in line with `sources`, copying only the `changed` and new paths.
+
+        Returns the number of wheel paths restaged.
+        """
+        def unstage(path):
+            staged = os.path.join(self.bdist_dir, path)
+            if os.path.islink(staged) or os.path.isfile(staged):
+                os.unlink(staged)
+            elif os.path.isdir(staged):
+                remove_tree(staged, dry_run=self.dry_run)
+            symlinks.pop(path, None)
+
+        restaged = [path for path, source in sources.items()
+                    if source in changed or old_sources.get(path) != source]
+        removed = [path for path in old_sources if path not in sources]
+        if not restaged and not removed:
+            return 0
+
+        for path in removed:
+            unstage(path)
+
+        scripts_prefix = f"{self.data_dir}/scripts/"
+        if any(path.startswith(scripts_prefix) for path in restaged):
+            # The shebangs are rewritten on the way
+            build_scripts = self.reinitialize_command("build_scripts")
+            build_scripts.executable = "python"
+            build_scripts.force = True
+            self.run_command("build_scripts")
+            build_scripts_dir = build_scripts.build_dir
+
+        linked_dirs = tuple(path + "/" for path, (_, link_dest_isdir) in symlinks.items() if link_dest_isdir)
+        for path in restaged:
+            # Shipped through a symlinked directory
+            if path.startswith(linked_dirs):
+                continue
+
+            source = sources[path]
+            staged = os.path.join(self.bdist_dir, path)
+            unstage(path)
+            if os.path.islink(source):
+                link_dest = os.readlink(source)
+                link_dest_isdir = os.path.isdir(os.path.join(os.path.dirname(source), link_dest))
+                symlinks[path] = (link_dest, link_dest_isdir)
+                self.events.emit(SYMLINK_REGISTERED, source, staged, link_dest, link_dest_isdir)
+            elif os.path.isfile(source):
+                if path.startswith(scripts_prefix):
+                    source = os.path.join(build_scripts_dir, os.path.basename(source))
+                self.mkpath(os.path.dirname(staged))
+                copy_file(source, staged, preserve_mode=1, preserve_times=1, verbose=0, dry_run=self.dry_run)
+                self.events.emit(FILE_STAGED, source, staged)
+        return len(restaged) + len(removed)
+
+    def write_metadata(self):
+        """Writes the `.dist-info` the wheel would have, without RECORD, into the dist-dir without staging any files.
+
+        This is what a PEP 517 `prepare_metadata_for_build_wheel` hook returns.
+        """
+        self.run_command("egg_info")
+
+        egg_info = self.get_finalized_command("egg_info").egg_info
+        distinfo_path = os.path.join(self.dist_dir, self.get_distinfo_dirname())
+        # `egg2dist` consumes the egg-info it converts
+        egginfo_path = distinfo_path[:-len(".dist-info")] + ".egg-info"
+        for path in (distinfo_path, egginfo_path):
+            if os.path.exists(path):
+                remove_tree(path, dry_run=self.dry_run)
+        self.mkpath(self.dist_dir)
+        self.copy_tree(egg_info, egginfo_path)
+        _bdist_wheel.egg2dist(self, egginfo_path, distinfo_path)
+
+        self.write_wheelfile(distinfo_path)
+
+        files, symlinks = self.scan_plan_sources()
+        if self.data_wheels:
+            owners = {path: self.get_data_wheel_index(path, os.path.getsize(source) if source is not None else None)
+                      for path, source in files}
+            routes = self.route_data_wheel_symlinks(owners, symlinks)
+            symlinks = [symlink for symlink in symlinks if routes[symlink[0]] is None]
         write_symlinks_file(os.path.join(distinfo_path, SYMLINKS_FILE), symlinks)
+        self.write_axle_markers(distinfo_path)
+        log.info("wrote metadata with %d symlink(s) to %s", len(symlinks), distinfo_path)
 
+    def write_axle_markers(self, distinfo_path):
         with open(os.path.join(distinfo_path, AXLE_LOCK_FILE), "wb"):
             pass
 
@@ -415,5 +1625,112 @@ class BdistAxle(_bdist_wheel):
             with open(os.path.join(distinfo_path, REQUIRE_LIBPYTHON_FILE), "wb"):
                 pass
 
+    def egg2dist(self, egginfo_path, distinfo_path):
+        with self.events.phase("egg2dist"):
+            self._egg2dist(egginfo_path, distinfo_path)
+
+    def _egg2dist(self, egginfo_path, distinfo_path):
+        super().egg2dist(egginfo_path, distinfo_path)
+
+        if self.split_debug_info:
+            self.split_native_debug_info()
+
+        if self.compile_bytecode:
+            self.byte_compile_modules()
+
+        install_cmd = self.get_finalized_command("install")
+
+        symlinks = install_cmd.get_symlinks()
+        if self.elf_index:
+            self.write_elf_index(os.path.join(distinfo_path, ELF_INDEX_FILE), symlinks.relative_to(self.bdist_dir))
+
+        wheel_symlinks = symlinks.relative_to(self.bdist_dir)
+        if self.data_wheels:
+            wheel_symlinks = self.split_data_wheels(wheel_symlinks)
+        if self.content_index:
+            wheel_symlinks = list(wheel_symlinks)
+            self.write_content_index(os.path.join(distinfo_path, CONTENT_INDEX_FILE), self.bdist_dir, wheel_symlinks)
+        write_symlinks_file(os.path.join(distinfo_path, SYMLINKS_FILE), wheel_symlinks)
+
+        if self.skip_unchanged:
+            if not self._fingerprint["content"]:
+                self._fingerprint["content"] = content_digest(self.get_fingerprint_inputs(),
+                                                              self.get_fingerprint_seed())
+            with open(os.path.join(distinfo_path, FINGERPRINT_FILE), "w") as f:
+                f.write(self._fingerprint["content"] + "\n")
+
+        self.write_axle_markers(distinfo_path)
+
     def write_wheelfile(self, wheelfile_base, generator="bdist_axle (" + __version__ + ")"):
         return super().write_wheelfile(wheelfile_base, generator)
+
+
+# Run as the setup script of the project: importing pip, as `wheel_axle.runtime` does, from anything else makes the
+# `_distutils_hack` of setuptools drop the distutils modules already imported
+_BUILD_SCRIPT = """\
+__file__ = "setup.py"
+import sys
+from wheel_axle.bdist_axle import _build_project
+_build_project(*sys.argv[1:])
+"""
+
+
+def _build_project(dist_dir, options, result_path):
+    """Builds the axle of the project in the cwd for `build`, writing the wheels or the error to `result_path`"""
+    result = {}
+    try:
+        options = json.loads(options)
+        dist = run_setup("setup.py", stop_after="config")
+
+        bdist_axle = dist.cmdclass.get("bdist_axle", BdistAxle)
+        dist.cmdclass = dict(dist.cmdclass, bdist_axle=bdist_axle)
+        option_names = {option[0].rstrip("=").replace("-", "_") for option in bdist_axle.user_options}
+        unknown = sorted(name for name in options if name not in option_names)
+        if unknown:
+            raise DistutilsOptionError(f"unknown bdist_axle option(s): {', '.join(unknown)}")
+
+        bdist_axle_options = dist.get_option_dict("bdist_axle")
+        bdist_axle_options.update((name, ("build()", value)) for name, value in options.items())
+        bdist_axle_options["dist_dir"] = ("build()", dist_dir)
+        dist.run_command("bdist_axle")
+        result["wheels"] = [filename for command, _, filename in dist.dist_files if command == "bdist_wheel"]
+    except DistutilsError as e:
+        result["error"] = type(e).__name__, str(e)
+    finally:
+        with open(result_path, "w") as f:
+            json.dump(result, f)
+
+
+def build(project_dir, dist_dir, **options):
+    """Builds the axle of the project in `project_dir` into `dist_dir` and returns the paths of the wheels written.
+
+    `options` are the `bdist_axle` options named with underscores, e.g. `root_is_pure="false"` or `layout=True`.
+    The setup script runs in a Python subprocess with `project_dir` as its cwd, leaving the cwd, `sys.argv` and the
+    modules of the calling process alone, so several projects can be built at once on different threads. A project
+    must not be built twice at the same time.
+    """
+    project_dir = os.path.abspath(project_dir)
+    dist_dir = os.path.abspath(dist_dir)
+    options = {name: os.path.abspath(value) if name in ("bdist_dir", "debug_info_dir") and value else value
+               for name, value in options.items()}
+
+    with tempfile.TemporaryDirectory(prefix="axle_build") as tmp_dir:
+        result_path = os.path.join(tmp_dir, "result.json")
+        args = [sys.executable, "-c", _BUILD_SCRIPT, dist_dir, json.dumps(options), result_path]
+        try:
+            returncode = subprocess.call(args, cwd=project_dir,
+                                         env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        except OSError as e:
+            raise DistutilsExecError("unable to execute %r: %s" % (sys.executable, e.strerror))
+        try:
+            with open(result_path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            result = {}
+
+    if "error" in result:
+        error_type, message = result["error"]
+        raise getattr(distutils.errors, error_type, DistutilsError)(message)
+    if "wheels" not in result:
+        raise DistutilsExecError(f"building the axle of {project_dir!r} failed with exit code {returncode}")
+    return result["wheels"]
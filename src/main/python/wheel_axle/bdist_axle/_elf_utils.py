@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import mmap
+import os
+import shutil
+import struct
+import subprocess
+from distutils.errors import DistutilsExecError, DistutilsFileError
+
+ELF_MAGIC = b"\x7fELF"
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+PT_LOAD = 1
+PT_DYNAMIC = 2
+
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_SONAME = 14
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+# (program header table offset, entry size, entry count) offsets and formats in the ELF header,
+# program header field layout and dynamic entry layout per ELF class
+_ELF_LAYOUTS = {
+    ELFCLASS32: ("I", 0x1C, 0x2A, 0x2C, "IIIIIIII", (0, 1, 2, 4), "iI"),
+    ELFCLASS64: ("Q", 0x20, 0x36, 0x38, "IIQQQQQQ", (0, 2, 3, 5), "qQ"),
+}
+
+
+def is_elf_file(path):
+    """Returns True if `path` is a regular file (not a symlink) starting with the ELF magic"""
+    if os.path.islink(path) or not os.path.isfile(path):
+        return False
+
+    with open(path, "rb") as f:
+        return f.read(len(ELF_MAGIC)) == ELF_MAGIC
+
+
+def _run_objcopy(objcopy, *args):
+    try:
+        subprocess.run([objcopy] + list(args), check=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as e:
+        raise DistutilsExecError("unable to execute %r: %s" % (objcopy, e.strerror))
+    except subprocess.CalledProcessError as e:
+        raise DistutilsExecError("command %r failed with exit code %d: %s" %
+                                 (e.cmd, e.returncode, e.stdout.decode(errors="replace").strip()))
+
+
+def split_debug_info(path, debug_path, objcopy="objcopy"):
+    """Moves the debug info of the ELF file `path` into `debug_path` and strips `path` in place.
+
+    The stripped file replaces the original under the same name, so any symlinks
+    pointing at it remain valid. Returns a tuple of sizes before and after stripping.
+    """
+    size = os.stat(path).st_size
+    os.makedirs(os.path.dirname(debug_path), exist_ok=True)
+
+    stripped_path = path + ".stripped"
+    try:
+        _run_objcopy(objcopy, "--only-keep-debug", path, debug_path)
+        _run_objcopy(objcopy, "--strip-debug", "--add-gnu-debuglink=" + debug_path, path, stripped_path)
+        shutil.copymode(path, stripped_path)
+        os.replace(stripped_path, path)
+    finally:
+        if os.path.exists(stripped_path):
+            os.unlink(stripped_path)
+
+    return size, os.stat(path).st_size
+
+
+def _read_cstr(buf, offset):
+    end = buf.find(b"\0", offset)
+    if end < 0:
+        raise ValueError("unterminated string at offset %d" % offset)
+    return buf[offset:end].decode("utf-8", errors="surrogateescape")
+
+
+def _scan_elf_dynamic(buf):
+    if len(buf) < 0x40 or buf[:4] != ELF_MAGIC:
+        return None
+
+    ei_class = buf[4]
+    ei_data = buf[5]
+    if ei_class not in _ELF_LAYOUTS or ei_data not in (ELFDATA2LSB, ELFDATA2MSB):
+        return None
+
+    bo = "<" if ei_data == ELFDATA2LSB else ">"
+    off_fmt, phoff_at, phentsize_at, phnum_at, ph_fmt, ph_fields, dyn_fmt = _ELF_LAYOUTS[ei_class]
+    e_phoff, = struct.unpack_from(bo + off_fmt, buf, phoff_at)
+    e_phentsize, = struct.unpack_from(bo + "H", buf, phentsize_at)
+    e_phnum, = struct.unpack_from(bo + "H", buf, phnum_at)
+
+    ph_struct = struct.Struct(bo + ph_fmt)
+    type_idx, offset_idx, vaddr_idx, filesz_idx = ph_fields
+    loads = []
+    dynamic = None
+    for i in range(e_phnum):
+        ph = ph_struct.unpack_from(buf, e_phoff + i * e_phentsize)
+        p_type = ph[type_idx]
+        if p_type == PT_LOAD:
+            loads.append((ph[vaddr_idx], ph[filesz_idx], ph[offset_idx]))
+        elif p_type == PT_DYNAMIC:
+            dynamic = (ph[offset_idx], ph[filesz_idx])
+
+    if dynamic is None:
+        return None
+
+    dyn_struct = struct.Struct(bo + dyn_fmt)
+    entries = []
+    strtab_addr = None
+    dyn_offset, dyn_size = dynamic
+    for entry_offset in range(dyn_offset, dyn_offset + dyn_size, dyn_struct.size):
+        d_tag, d_val = dyn_struct.unpack_from(buf, entry_offset)
+        if d_tag == DT_NULL:
+            break
+        if d_tag == DT_STRTAB:
+            strtab_addr = d_val
+        elif d_tag in (DT_NEEDED, DT_SONAME, DT_RPATH, DT_RUNPATH):
+            entries.append((d_tag, d_val))
+
+    if strtab_addr is None:
+        return None
+
+    for vaddr, filesz, offset in loads:
+        if vaddr <= strtab_addr < vaddr + filesz:
+            strtab = strtab_addr - vaddr + offset
+            break
+    else:
+        raise ValueError("DT_STRTAB address 0x%x is not in any loadable segment" % strtab_addr)
+
+    info = {"soname": None, "needed": [], "rpath": [], "runpath": []}
+    for d_tag, d_val in entries:
+        value = _read_cstr(buf, strtab + d_val)
+        if d_tag == DT_NEEDED:
+            info["needed"].append(value)
+        elif d_tag == DT_SONAME:
+            info["soname"] = value
+        elif d_tag == DT_RPATH:
+            info["rpath"].extend(p for p in value.split(":") if p)
+        else:
+            info["runpath"].extend(p for p in value.split(":") if p)
+    return info
+
+
+def read_elf_dynamic(path):
+    """Reads the dynamic linking info of the ELF file `path` by memory-mapping it.
+
+    Only the headers, the dynamic segment and the referenced strings are touched.
+    Returns a dict with `soname`, `needed`, `rpath` and `runpath` keys or None if `path` is
+    a symlink, is not an ELF file or has no dynamic segment. Raises `DistutilsFileError` if `path`
+    is a truncated or malformed ELF file.
+    """
+    if os.path.islink(path):
+        return None
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < 0x40:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            try:
+                return _scan_elf_dynamic(buf)
+            except (struct.error, ValueError) as e:
+                raise DistutilsFileError("malformed ELF file %r: %s" % (path, e))
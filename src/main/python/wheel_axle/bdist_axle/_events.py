@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import contextlib
+import logging
+import threading
+from distutils import log
+
+# hook(PHASE_START, name)
+PHASE_START = "phase_start"
+# hook(PHASE_END, name)
+PHASE_END = "phase_end"
+# hook(FILE_STAGED, src, dst)
+FILE_STAGED = "file_staged"
+# hook(SYMLINK_REGISTERED, src, dst, link_dest, link_dest_isdir)
+SYMLINK_REGISTERED = "symlink_registered"
+# hook(MEMBER_WRITTEN, arcname, size, compressed_size)
+MEMBER_WRITTEN = "member_written"
+
+
+def is_verbose():
+    """Returns True if debug messages are actually emitted by the `distutils` log"""
+    global_log = getattr(log, "_global_log", None)
+    if hasattr(global_log, "isEnabledFor"):
+        return global_log.isEnabledFor(logging.DEBUG)
+    if hasattr(global_log, "threshold"):
+        return global_log.threshold <= log.DEBUG
+    return logging.getLogger().isEnabledFor(logging.DEBUG)
+
+
+class AxleEvents:
+    """Dispatches build events to the registered hooks.
+
+    A hook is a callable invoked as `hook(event, *args)` for every event, see the event constants for the arguments.
+    """
+
+    def __init__(self):
+        self._hooks = []
+        self._local = threading.local()
+
+    def add_hook(self, hook):
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def emit(self, event, *args):
+        buffered = getattr(self._local, "buffered", None)
+        if buffered is not None:
+            buffered.append((event, args))
+            return
+        for hook in self._hooks:
+            hook(event, *args)
+
+    @contextlib.contextmanager
+    def buffer(self):
+        """Holds back the events emitted by the current thread in the returned list instead of dispatching them"""
+        buffered = self._local.buffered = []
+        try:
+            yield buffered
+        finally:
+            self._local.buffered = None
+
+    def replay(self, buffered):
+        """Dispatches the events held back by `buffer`"""
+        for event, args in buffered:
+            self.emit(event, *args)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.emit(PHASE_START, name)
+        try:
+            yield
+        finally:
+            self.emit(PHASE_END, name)
+
+
+NO_EVENTS = AxleEvents()
+
+
+class SummaryLogHook:
+    """Counts the staged files, symlinks and members per phase and logs a summary when a phase ends.
+
+    Per-file messages are only formatted and logged when debug logging is enabled.
+    """
+
+    def __init__(self):
+        self._verbose = None
+        self._phases = []
+
+    def __call__(self, event, *args):
+        if event == PHASE_START:
+            if self._verbose is None:
+                self._verbose = is_verbose()
+            self._phases.append([args[0], 0, 0, 0, 0, 0])
+        elif event == PHASE_END:
+            name, files, symlinks, members, size, compressed_size = self._phases.pop()
+            if self._phases:
+                parent = self._phases[-1]
+                for idx, count in enumerate((files, symlinks, members, size, compressed_size), 1):
+                    parent[idx] += count
+            if files or symlinks:
+                log.info("%s: staged %d file(s), registered %d symlink(s)", name, files, symlinks)
+            if members:
+                log.info("%s: wrote %d member(s), %d -> %d bytes", name, members, size, compressed_size)
+            if not self._phases:
+                self._verbose = None
+        elif not self._phases:
+            return
+        elif event == FILE_STAGED:
+            self._phases[-1][1] += 1
+            if self._verbose:
+                log.debug("copying %s -> %s", *args)
+        elif event == SYMLINK_REGISTERED:
+            self._phases[-1][2] += 1
+            if self._verbose:
+                log.debug("registering link %s (%s) -> %s", args[0], args[2], args[1])
+        elif event == MEMBER_WRITTEN:
+            phase = self._phases[-1]
+            phase[3] += 1
+            phase[4] += args[1]
+            phase[5] += args[2]
+            if self._verbose:
+                log.debug("adding %r", args[0])
@@ -15,12 +15,27 @@
 # limitations under the License.
 #
 
+import hashlib
+import importlib.util
 import os
+import py_compile
+import stat
+import subprocess
+import sys
+import zlib
 from distutils import dir_util, log
-from distutils.errors import DistutilsFileError
+from distutils.errors import DistutilsExecError, DistutilsFileError
 
+from wheel_axle.bdist_axle._events import FILE_STAGED, SYMLINK_REGISTERED, is_verbose
 
-def copy_link(src, dst, update=0, verbose=1, dry_run=0, reproduce_link=False):
+CONTENT_HASH_ALGORITHM = "blake2b-128"
+
+
+def copy_link(src, dst, update=0, verbose=1, dry_run=0, reproduce_link=False, events=None):
+    """Registers (or reproduces) the symlink `src` at `dst`.
+
+    With `events` a registered link is reported as a `SYMLINK_REGISTERED` event instead of being logged.
+    """
     if os.path.isdir(dst):
         dir = dst
         dst = os.path.join(dst, os.path.basename(src))
@@ -30,7 +45,9 @@ def copy_link(src, dst, update=0, verbose=1, dry_run=0, reproduce_link=False):
     link_dest = os.readlink(src)
     link_dest_isdir = os.path.isdir(os.path.join(os.path.dirname(src), link_dest))
 
-    if verbose >= 1:
+    if events is not None and not reproduce_link:
+        events.emit(SYMLINK_REGISTERED, src, dst, link_dest, link_dest_isdir)
+    elif verbose >= 1 and (events is None or is_verbose()):
         log.info("%s link %s (%s) -> %s",
                  "reproducing" if reproduce_link else "registering",
                  src,
@@ -38,13 +55,21 @@ def copy_link(src, dst, update=0, verbose=1, dry_run=0, reproduce_link=False):
                  dir if os.path.basename(dst) == os.path.basename(src) else dst)
 
     if reproduce_link:
+        if os.path.lexists(dst):
+            os.unlink(dst)
         os.symlink(link_dest, dst, link_dest_isdir)
 
     return dst, link_dest, link_dest_isdir
 
 
 def copy_tree(src, dst, preserve_mode=1, preserve_times=1,
-              preserve_symlinks=0, update=0, verbose=1, dry_run=0):
+              preserve_symlinks=0, update=0, verbose=1, dry_run=0, events=None, outputs=None, links=None):
+    """Copies the tree `src` into `dst` registering the symlinks instead of copying them.
+
+    With `events` the copied files and registered links are reported as `FILE_STAGED` and `SYMLINK_REGISTERED`
+    events instead of being logged one by one. The copied files and registered links are appended to
+    `outputs` and `links` (new lists by default), which are returned.
+    """
     from distutils.file_util import copy_file
 
     if not dry_run and not os.path.isdir(src):
@@ -62,8 +87,10 @@ def copy_tree(src, dst, preserve_mode=1, preserve_times=1,
     if not dry_run:
         dir_util.mkpath(dst, verbose=verbose)
 
-    outputs = []
-    links = []
+    if outputs is None:
+        outputs = []
+    if links is None:
+        links = []
 
     for n in names:
         src_name = os.path.join(src, n)
@@ -76,20 +103,108 @@ def copy_tree(src, dst, preserve_mode=1, preserve_times=1,
         if os.path.islink(src_name):
             link_dest = os.readlink(src_name)
             link_dest_isdir = os.path.isdir(os.path.join(os.path.dirname(src_name), link_dest))
-            if verbose >= 1:
+            if events is not None:
+                events.emit(SYMLINK_REGISTERED, src_name, dst_name, link_dest, link_dest_isdir)
+            elif verbose >= 1:
                 log.info("registering link %s (%s) -> %s", src_name, link_dest, dst_name)
             links.append((dst_name, link_dest, link_dest_isdir))
 
         elif os.path.isdir(src_name):
-            _outputs, _links = copy_tree(src_name, dst_name, preserve_mode,
-                                         preserve_times, preserve_symlinks, update,
-                                         verbose=verbose, dry_run=dry_run)
-            outputs.extend(_outputs)
-            links.extend(_links)
+            copy_tree(src_name, dst_name, preserve_mode, preserve_times, preserve_symlinks, update,
+                      verbose=verbose, dry_run=dry_run, events=events, outputs=outputs, links=links)
         else:
             copy_file(src_name, dst_name, preserve_mode,
-                      preserve_times, update, verbose=verbose,
+                      preserve_times, update, verbose=verbose if events is None else 0,
                       dry_run=dry_run)
+            if events is not None:
+                events.emit(FILE_STAGED, src_name, dst_name)
             outputs.append(dst_name)
 
     return outputs, links
+
+
+def byte_compile_file(path, dfile, invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH):
+    """Compiles `path` into its `__pycache__` for the running interpreter, returning the bytecode file name"""
+    cfile = importlib.util.cache_from_source(path)
+    py_compile.compile(path, cfile=cfile, dfile=dfile, doraise=True, invalidation_mode=invalidation_mode)
+    return cfile
+
+
+def byte_compile_files(paths, strip_dir, invalidation_mode="checked-hash"):
+    """Compiles `paths` in a `compileall` run of the running interpreter, naming the sources relative to `strip_dir`.
+
+    A new interpreter is started rather than a worker process of this one, which with the `spawn` and `forkserver`
+    start methods would re-run the setup script as its `__main__`.
+    """
+    args = [sys.executable, "-m", "compileall", "-q", "-f", "-s", strip_dir, "--invalidation-mode", invalidation_mode,
+            "-i", "-"]
+    try:
+        subprocess.run(args, input=b"\n".join(os.fsencode(path) for path in paths), check=True,
+                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as e:
+        raise DistutilsExecError("unable to execute %r: %s" % (sys.executable, e.strerror))
+    except subprocess.CalledProcessError as e:
+        raise DistutilsExecError("compiling bytecode failed with exit code %d: %s" %
+                                 (e.returncode, e.stdout.decode(errors="replace").strip()))
+
+
+def estimate_compressed_size(path, size, sample_size=64 * 1024, level=zlib.Z_DEFAULT_COMPRESSION):
+    """Estimates the deflated size of `path` by compressing a sample of at most `sample_size` bytes from its head"""
+    if not size:
+        return 0
+
+    with open(path, "rb") as f:
+        sample = f.read(sample_size)
+    if not sample:
+        return 0
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = len(compressor.compress(sample)) + len(compressor.flush())
+    return min(size, int(size * compressed / len(sample)) + 1)
+
+
+def content_hash(path):
+    """Returns the hex BLAKE2b-128 digest and the size of the contents of `path`"""
+    digest = hashlib.blake2b(digest_size=16)
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _digest_paths(paths, seed, digest_file):
+    digest = hashlib.sha256(seed.encode("utf-8"))
+    for path in paths:
+        digest.update(os.fsencode(path) + b"\0")
+        try:
+            st = os.lstat(path)
+        except FileNotFoundError:
+            digest.update(b"-\0")
+            continue
+        if stat.S_ISLNK(st.st_mode):
+            digest.update(b"L" + os.fsencode(os.readlink(path)) + b"\0")
+        else:
+            digest.update(digest_file(path, st) + b"\0")
+    return digest.hexdigest()
+
+
+def stat_digest(paths, seed=""):
+    """Digests `seed` and the type, size, mode and modification time (or symlink target) of `paths`"""
+    return _digest_paths(paths, seed, lambda path, st: b"%d:%d:%d" % (st.st_mode, st.st_size, st.st_mtime_ns))
+
+
+def content_digest(paths, seed=""):
+    """Digests `seed` and the contents (or symlink target) of `paths`"""
+
+    def digest_file(path, st):
+        if stat.S_ISDIR(st.st_mode):
+            return b"D"
+        file_digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                file_digest.update(chunk)
+        return file_digest.digest()
+
+    return _digest_paths(paths, seed, digest_file)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import threading
+from array import array
+
+
+class PathStore:
+    """A string table holding the paths staged by a build.
+
+    Directories (and other repeated strings such as link targets) are interned once and file names
+    are packed into a single byte buffer, so a stored path costs the length of its name plus a few
+    bytes of integer ids instead of a full string object. Paths are decoded back into strings on access.
+    Paths can be stored from several threads, the ids then depending on the order they are stored in.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._strings = []
+        self._string_ids = {}
+        self._path_dirs = array("I")
+        self._name_ends = array("Q", [0])
+        self._names = bytearray()
+
+    def __len__(self):
+        return len(self._path_dirs)
+
+    def intern(self, s):
+        """Returns the id of the string `s`, adding it to the table if needed"""
+        string_id = self._string_ids.get(s)
+        if string_id is None:
+            with self._lock:
+                string_id = self._string_ids.get(s)
+                if string_id is None:
+                    string_id = len(self._strings)
+                    self._strings.append(s)
+                    self._string_ids[s] = string_id
+        return string_id
+
+    def string(self, string_id):
+        return self._strings[string_id]
+
+    def find(self, s):
+        """Returns the id of the string `s` without adding it, None if it is not in the table"""
+        return self._string_ids.get(s)
+
+    def add(self, path):
+        """Stores `path` returning its id"""
+        dir_name, name = os.path.split(path)
+        dir_id = self.intern(dir_name)
+        name = os.fsencode(name)
+        with self._lock:
+            self._path_dirs.append(dir_id)
+            self._names += name
+            self._name_ends.append(len(self._names))
+            return len(self._path_dirs) - 1
+
+    def get(self, path_id):
+        """Returns the path stored under `path_id`"""
+        dir_name = self._strings[self._path_dirs[path_id]]
+        name = os.fsdecode(bytes(self._names[self._name_ends[path_id]:self._name_ends[path_id + 1]]))
+        return os.path.join(dir_name, name) if dir_name else name
+
+    def key(self, path_id):
+        """Returns a hashable key equal for the ids of equal paths without decoding them"""
+        return self._path_dirs[path_id], bytes(self._names[self._name_ends[path_id]:self._name_ends[path_id + 1]])
+
+    def find_key(self, path):
+        """Returns the key `key` returns for the ids of `path` without storing it, None if no stored path equals it"""
+        dir_name, name = os.path.split(path)
+        dir_id = self._string_ids.get(dir_name)
+        if dir_id is None:
+            return None
+        return dir_id, os.fsencode(name)
+
+
+class PathList:
+    """A list of paths kept as ids into a `PathStore`.
+
+    The keys of the paths are only hashed into a set by the first membership test, and kept up to date from then on.
+    """
+
+    def __init__(self, store, paths=()):
+        self.store = store
+        self._ids = array("Q")
+        self._keys = None
+        self.extend(paths)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        get = self.store.get
+        for path_id in self._ids:
+            yield get(path_id)
+
+    def __getitem__(self, idx):
+        return self.store.get(self._ids[idx])
+
+    def __delitem__(self, idx):
+        del self._ids[idx]
+        self._keys = None
+
+    def __contains__(self, path):
+        key = self.store.find_key(path)
+        if key is None:
+            return False
+        if self._keys is None:
+            self._keys = set(map(self.store.key, self._ids))
+        return key in self._keys
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, list(self))
+
+    def append(self, path):
+        path_id = self.store.add(path)
+        self._ids.append(path_id)
+        if self._keys is not None:
+            self._keys.add(self.store.key(path_id))
+
+    def extend(self, paths):
+        if isinstance(paths, PathList) and paths.store is self.store:
+            self._ids.extend(paths._ids)
+            if self._keys is not None:
+                self._keys.update(map(self.store.key, paths._ids))
+        else:
+            for path in paths:
+                self.append(path)
+
+    def select(self, predicate):
+        """Returns a new list sharing the ids of the paths for which `predicate(path)` is true"""
+        result = PathList(self.store)
+        get = self.store.get
+        result._ids.extend(path_id for path_id in self._ids if predicate(get(path_id)))
+        return result
+
+
+class SymlinkList:
+    """A list of `(path, link_dest, link_dest_isdir)` symlink tuples kept as ids into a `PathStore`.
+
+    As in `PathList` the keys of the symlinks are hashed into a set on the first membership test or merge.
+    """
+
+    def __init__(self, store, symlinks=()):
+        self.store = store
+        self._path_ids = array("Q")
+        self._dest_ids = array("I")
+        self._isdirs = bytearray()
+        self._keys = None
+        self.extend(symlinks)
+
+    def __len__(self):
+        return len(self._path_ids)
+
+    def __iter__(self):
+        get = self.store.get
+        string = self.store.string
+        for path_id, dest_id, isdir in zip(self._path_ids, self._dest_ids, self._isdirs):
+            yield get(path_id), string(dest_id), bool(isdir)
+
+    def __getitem__(self, idx):
+        return self.store.get(self._path_ids[idx]), self.store.string(self._dest_ids[idx]), bool(self._isdirs[idx])
+
+    def __contains__(self, symlink):
+        path, link_dest, link_dest_isdir = symlink
+        path_key = self.store.find_key(path)
+        dest_id = self.store.find(link_dest)
+        if path_key is None or dest_id is None:
+            return False
+        return (path_key, dest_id, bool(link_dest_isdir)) in self._get_keys()
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, list(self))
+
+    def _get_keys(self):
+        if self._keys is None:
+            key = self.store.key
+            self._keys = {(key(path_id), dest_id, bool(isdir))
+                          for path_id, dest_id, isdir in zip(self._path_ids, self._dest_ids, self._isdirs)}
+        return self._keys
+
+    def _append_ids(self, path_id, dest_id, isdir):
+        self._path_ids.append(path_id)
+        self._dest_ids.append(dest_id)
+        self._isdirs.append(1 if isdir else 0)
+        if self._keys is not None:
+            self._keys.add((self.store.key(path_id), dest_id, bool(isdir)))
+
+    def _entries(self, symlinks):
+        if isinstance(symlinks, SymlinkList) and symlinks.store is self.store:
+            return zip(symlinks._path_ids, symlinks._dest_ids, symlinks._isdirs)
+        return ((self.store.add(path), self.store.intern(link_dest), link_dest_isdir)
+                for path, link_dest, link_dest_isdir in symlinks)
+
+    def append(self, symlink):
+        path, link_dest, link_dest_isdir = symlink
+        self._append_ids(self.store.add(path), self.store.intern(link_dest), link_dest_isdir)
+
+    def extend(self, symlinks):
+        for entry in self._entries(symlinks):
+            self._append_ids(*entry)
+
+    def merge(self, symlinks):
+        """Appends the `symlinks` not in this list yet, comparing them by their ids rather than as strings"""
+        key = self.store.key
+        keys = self._get_keys()
+        for path_id, dest_id, isdir in self._entries(symlinks):
+            if (key(path_id), dest_id, bool(isdir)) not in keys:
+                self._append_ids(path_id, dest_id, isdir)
+
+    def paths(self):
+        """Iterates over the symlink paths only"""
+        get = self.store.get
+        for path_id in self._path_ids:
+            yield get(path_id)
+
+    def select(self, predicate):
+        """Returns a new list sharing the ids of the symlinks for which `predicate(path)` is true"""
+        result = SymlinkList(self.store)
+        get = self.store.get
+        for path_id, dest_id, isdir in zip(self._path_ids, self._dest_ids, self._isdirs):
+            if predicate(get(path_id)):
+                result._append_ids(path_id, dest_id, isdir)
+        return result
+
+    def relative_to(self, base):
+        """Iterates over the symlink tuples with the paths made relative to `base`"""
+        for path, link_dest, link_dest_isdir in self:
+            yield os.path.relpath(path, base), link_dest, link_dest_isdir
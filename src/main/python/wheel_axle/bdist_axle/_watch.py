@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+from distutils import log
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+
+IN_WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+                 IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+INOTIFY_EVENT = struct.Struct("iIII")
+INOTIFY_BUFFER_SIZE = 64 * 1024
+
+# A compiler or an editor rarely writes a single file, wait for the changes to settle
+DEFAULT_SETTLE_DELAY = 0.2
+
+
+class PollingWatcher:
+    """Detects the changes to the entries of the watched directories by comparing their `lstat` every `interval`"""
+
+    def __init__(self, interval=1.0, settle_delay=DEFAULT_SETTLE_DELAY):
+        self._interval = interval
+        self._settle_delay = settle_delay
+        self._snapshots = {}
+
+    def watch(self, dirs):
+        """Replaces the watched directories with `dirs`"""
+        dirs = set(dirs)
+        for dir_path in list(self._snapshots):
+            if dir_path not in dirs:
+                del self._snapshots[dir_path]
+        for dir_path in dirs:
+            if dir_path not in self._snapshots:
+                self._snapshots[dir_path] = self._snapshot(dir_path)
+
+    def _snapshot(self, dir_path):
+        entries = {}
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    entries[entry.name] = (st.st_mode, st.st_size, st.st_mtime_ns, st.st_ino)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return entries
+
+    def _poll(self):
+        changed = set()
+        for dir_path, snapshot in self._snapshots.items():
+            current = self._snapshot(dir_path)
+            for name in snapshot.keys() | current.keys():
+                if snapshot.get(name) != current.get(name):
+                    changed.add(os.path.join(dir_path, name))
+            self._snapshots[dir_path] = current
+        return changed
+
+    def wait(self):
+        """Blocks until an entry of the watched directories changes and returns the paths changed"""
+        while True:
+            changed = self._poll()
+            if changed:
+                break
+            time.sleep(self._interval)
+        while True:
+            time.sleep(self._settle_delay)
+            settled = self._poll()
+            if not settled:
+                return changed
+            changed |= settled
+
+    def close(self):
+        self._snapshots.clear()
+
+
+class InotifyWatcher:
+    """Detects the changes to the entries of the watched directories with Linux `inotify`"""
+
+    def __init__(self, settle_delay=DEFAULT_SETTLE_DELAY):
+        self._settle_delay = settle_delay
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._libc.inotify_init1.argtypes = [ctypes.c_int]
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._wds = {}
+        self._dirs = {}
+
+    def watch(self, dirs):
+        """Replaces the watched directories with `dirs`"""
+        dirs = set(dirs)
+        for dir_path in list(self._dirs):
+            if dir_path not in dirs:
+                self._libc.inotify_rm_watch(self._fd, self._dirs.pop(dir_path))
+        for dir_path in dirs:
+            if dir_path in self._dirs:
+                continue
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_path), IN_WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                raise OSError(err, os.strerror(err), dir_path)
+            self._wds[wd] = dir_path
+            self._dirs[dir_path] = wd
+
+    def _read(self, timeout):
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return set()
+
+        buf = os.read(self._fd, INOTIFY_BUFFER_SIZE)
+        changed = set()
+        offset = 0
+        while offset < len(buf):
+            wd, mask, _, name_len = INOTIFY_EVENT.unpack_from(buf, offset)
+            offset += INOTIFY_EVENT.size
+            name = buf[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+
+            dir_path = self._wds.get(wd)
+            if dir_path is None:
+                continue
+            if mask & IN_IGNORED:
+                # The directory is gone, a later `watch` picks it up again if it comes back
+                del self._wds[wd]
+                self._dirs.pop(dir_path, None)
+            changed.add(os.path.join(dir_path, os.fsdecode(name)) if name else dir_path)
+        return changed
+
+    def wait(self):
+        """Blocks until an entry of the watched directories changes and returns the paths changed"""
+        changed = set()
+        while not changed:
+            changed = self._read(None)
+        while True:
+            settled = self._read(self._settle_delay)
+            if not settled:
+                return changed
+            changed |= settled
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def open_watcher(interval=1.0, polling=False):
+    """Returns an `InotifyWatcher` where available, falling back to a `PollingWatcher` checking every `interval`"""
+    if not polling:
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            log.info("inotify is not available (%s), polling every %.1f second(s)", e, interval)
+    return PollingWatcher(interval)
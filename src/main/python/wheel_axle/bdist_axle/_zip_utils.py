@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import shutil
+import struct
+import zipfile
+
+# Extra field padding the local header so that the member data is aligned, as used by Android's `zipalign`
+ZIP_ALIGNMENT_EXTRA_ID = 0xD935
+ZIP_LOCAL_HEADER = struct.Struct("<4s22xHH")
+ZIP_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+ZIP_LOCAL_HEADER_SIZE = ZIP_LOCAL_HEADER.size
+ZIP64_LOCAL_EXTRA_SIZE = 20
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _encoded_name_length(zinfo):
+    try:
+        return len(zinfo.filename.encode("ascii"))
+    except UnicodeEncodeError:
+        return len(zinfo.filename.encode("utf-8"))
+
+
+def alignment_extra(header_offset, zinfo, alignment, zip64=None):
+    """Returns the extra field making the data of `zinfo` written at `header_offset` start on an `alignment` boundary.
+
+    Unless `zip64` is given, `zinfo.file_size` must be set, as it decides whether `zipfile` appends a Zip64 extra
+    field to the local header.
+    """
+    if zip64 is None:
+        zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+    data_offset = (header_offset + ZIP_LOCAL_HEADER_SIZE + _encoded_name_length(zinfo) + 6 +
+                   (ZIP64_LOCAL_EXTRA_SIZE if zip64 else 0))
+    padding = -data_offset % alignment
+    return struct.pack("<HHH", ZIP_ALIGNMENT_EXTRA_ID, 2 + padding, alignment) + b"\0" * padding
+
+
+def copy_member(src, info, dst, compress_type, alignment=None):
+    """Recompresses the member `info` of the ZIP file `src` into `dst` keeping its name, date and attributes.
+
+    With `alignment` the data of the member is written starting on an `alignment` boundary.
+    """
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.external_attr = info.external_attr
+    zinfo.create_system = info.create_system
+    zinfo.compress_type = compress_type
+    zinfo.file_size = info.file_size
+    if alignment:
+        zinfo.extra = alignment_extra(dst.fp.tell(), zinfo, alignment)
+
+    with src.open(info) as fsrc, dst.open(zinfo, "w") as fdst:
+        shutil.copyfileobj(fsrc, fdst, COPY_BUFFER_SIZE)
+    return zinfo
+
+
+def member_data_offset(buf, info):
+    """Returns the offset of the (compressed) data of the member `info` in `buf` holding the whole ZIP file"""
+    signature, name_length, extra_length = ZIP_LOCAL_HEADER.unpack_from(buf, info.header_offset)
+    if signature != ZIP_LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"bad local file header of {info.filename!r}")
+    return info.header_offset + ZIP_LOCAL_HEADER_SIZE + name_length + extra_length
+
+
+def member_alignment(info):
+    """Returns the alignment recorded in the `zipalign` extra field of `info`, None if it has none"""
+    extra = info.extra
+    while len(extra) >= 4:
+        extra_id, length = struct.unpack_from("<HH", extra)
+        if extra_id == ZIP_ALIGNMENT_EXTRA_ID and length >= 2:
+            return struct.unpack_from("<H", extra, 4)[0]
+        extra = extra[4 + length:]
+    return None
+
+
+def copy_raw_member(buf, info, dst, filename=None):
+    """Copies the member `info` of the ZIP file held in `buf` into `dst` without decompressing it.
+
+    The member keeps its compressed data, checksum, date and attributes, and is renamed to `filename` if given. A member
+    aligned with a `zipalign` extra field is realigned at its new offset.
+    """
+    zinfo = zipfile.ZipInfo(filename or info.filename, info.date_time)
+    zinfo.external_attr = info.external_attr
+    zinfo.create_system = info.create_system
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    zinfo.header_offset = dst.fp.tell()
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    alignment = member_alignment(info)
+    if alignment:
+        zinfo.extra = alignment_extra(zinfo.header_offset, zinfo, alignment, zip64)
+
+    start = member_data_offset(buf, info)
+    dst.fp.write(zinfo.FileHeader(zip64))
+    with memoryview(buf) as view:
+        for offset in range(start, start + info.compress_size, COPY_BUFFER_SIZE):
+            dst.fp.write(view[offset:min(offset + COPY_BUFFER_SIZE, start + info.compress_size)])
+
+    # `ZipFile` writes the next member and the central directory at `start_dir`
+    dst.start_dir = dst.fp.tell()
+    dst.filelist.append(zinfo)
+    dst.NameToInfo[zinfo.filename] = zinfo
+    dst._didModify = True
+    return zinfo
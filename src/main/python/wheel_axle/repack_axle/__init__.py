@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+from distutils.cmd import Command
+from distutils.errors import DistutilsOptionError
+from distutils.util import strtobool
+from glob import glob
+
+from wheel_axle.repack_axle._repacker import repack_wheel
+from wheel_axle.verify_axle import is_axle
+
+__all__ = ["RepackAxle", "repack_wheel"]
+
+
+class RepackAxle(Command):
+    description = "retag built axles or change their require-libpython marker without rebuilding them"
+
+    user_options = [("dist-dir=", "d",
+                     "directory holding the axles to repack (default: dist)"),
+                    ("wheels=", None,
+                     "comma-separated axles to repack (default: every axle in the dist-dir)"),
+                    ("dest-dir=", None,
+                     "directory to write the repacked axles to, keeping the originals "
+                     "(default: replace the originals)"),
+                    ("python-tag=", None,
+                     "set to override the Python tag (default: None)"),
+                    ("abi-tag=", None,
+                     "set to override the ABI tag (default: None)"),
+                    ("root-is-pure=", None,
+                     "set to override whether the wheel is pure (default: None)"),
+                    ("require-libpython=", None,
+                     "set to add or remove the require-libpython marker (default: None)"),
+                    ]
+
+    def initialize_options(self):
+        self.dist_dir = None
+        self.wheels = None
+        self.dest_dir = None
+        self.python_tag = None
+        self.abi_tag = None
+        self.root_is_pure = None
+        self.require_libpython = None
+
+    def finalize_options(self):
+        if self.dist_dir is None:
+            self.dist_dir = "dist"
+        if self.wheels:
+            self.wheels = [wheel.strip() for wheel in self.wheels.split(",") if wheel.strip()]
+        else:
+            self.wheels = [wheel for wheel in sorted(glob(os.path.join(self.dist_dir, "*.whl"))) if is_axle(wheel)]
+        if not self.wheels:
+            raise DistutilsOptionError(f"no wheels to repack in {self.dist_dir!r}")
+        if self.root_is_pure is not None:
+            self.root_is_pure = bool(strtobool(str(self.root_is_pure)))
+        if self.require_libpython is not None:
+            self.require_libpython = bool(strtobool(str(self.require_libpython)))
+
+    def run(self):
+        for wheel_file in self.wheels:
+            if not self.dry_run:
+                repack_wheel(wheel_file, self.dest_dir, python_tag=self.python_tag, abi_tag=self.abi_tag,
+                             root_is_pure=self.root_is_pure, require_libpython=self.require_libpython)
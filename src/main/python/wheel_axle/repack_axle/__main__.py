@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import argparse
+import sys
+from distutils import log
+from distutils.errors import DistutilsError
+from distutils.util import strtobool
+
+from wheel_axle.repack_axle import repack_wheel
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="python -m wheel_axle.repack_axle",
+                                     description="Retags axles or changes their require-libpython marker, copying "
+                                                 "the compressed members as is")
+    parser.add_argument("wheels", nargs="+", metavar="WHEEL", help="axle to repack")
+    parser.add_argument("--dest-dir", help="directory to write the repacked axles to, keeping the originals")
+    parser.add_argument("--python-tag", help="Python tag to set")
+    parser.add_argument("--abi-tag", help="ABI tag to set")
+    parser.add_argument("--root-is-pure", type=lambda value: bool(strtobool(value)), help="purity to set")
+    parser.add_argument("--require-libpython", type=lambda value: bool(strtobool(value)),
+                        help="whether the repacked axles require libpython")
+    options = parser.parse_args(args)
+
+    log.set_verbosity(log.INFO)
+    try:
+        for wheel_file in options.wheels:
+            print(repack_wheel(wheel_file, options.dest_dir, python_tag=options.python_tag, abi_tag=options.abi_tag,
+                               root_is_pure=options.root_is_pure, require_libpython=options.require_libpython))
+    except (DistutilsError, OSError) as e:
+        parser.exit(1, f"error: {e}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import base64
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import zipfile
+from distutils import log
+from distutils.errors import DistutilsFileError, DistutilsOptionError
+from email.generator import BytesGenerator
+from email.parser import BytesHeaderParser
+
+from wheel_axle.bdist_axle import CONTENT_INDEX_FILE, WHEEL_AXLE_DEPENDENCY, WHEEL_AXLE_REQUIRE_LIBPYTHON_DEPENDENCY
+from wheel_axle.bdist_axle._zip_utils import copy_raw_member
+from wheel_axle.runtime.constants import AXLE_LOCK_FILE, REQUIRE_LIBPYTHON_FILE
+
+WHEEL_AXLE_RUNTIME_REQUIREMENT = re.compile(rb"^Requires-Dist:\s*wheel[-_.]axle[-_.]runtime\b[^;\r\n]*",
+                                            re.IGNORECASE | re.MULTILINE)
+
+
+def _record_hash(data):
+    return "sha256=" + base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=").decode("ascii")
+
+
+def _split_tag(tag, name):
+    if not tag or "-" in tag:
+        raise DistutilsOptionError(f"invalid {name} tag {tag!r}")
+    return tag.split(".")
+
+
+def get_repacked_name(wheel_file, python_tag=None, abi_tag=None):
+    """Returns the file name of `wheel_file` retagged with `python_tag` and `abi_tag` where given"""
+    name = os.path.basename(wheel_file)
+    if not name.endswith(".whl") or name.count("-") not in (4, 5):
+        raise DistutilsFileError(f"{wheel_file!r} is not named like a wheel")
+    parts = name[:-len(".whl")].split("-")
+    impl_tag, old_abi_tag, plat_tag = parts[-3:]
+    tag = (python_tag or impl_tag, abi_tag or old_abi_tag, plat_tag)
+    return "-".join(parts[:-3] + list(tag)) + ".whl", tag
+
+
+def rewrite_wheelfile(data, tag, root_is_pure):
+    """Returns the WHEEL file `data` with the tags expanded from `tag` and, where given, `root_is_pure`"""
+    msg = BytesHeaderParser().parsebytes(data)
+    if root_is_pure is not None:
+        msg.replace_header("Root-Is-Purelib", str(bool(root_is_pure)).lower())
+    del msg["Tag"]
+    for impl in _split_tag(tag[0], "python"):
+        for abi in _split_tag(tag[1], "ABI"):
+            for plat in _split_tag(tag[2], "platform"):
+                msg["Tag"] = f"{impl}-{abi}-{plat}"
+    buf = io.BytesIO()
+    BytesGenerator(buf, maxheaderlen=0).flatten(msg)
+    return buf.getvalue()
+
+
+def rewrite_metadata(data, require_libpython):
+    """Returns the METADATA `data` requiring the `wheel-axle-runtime` that handles `require_libpython`.
+
+    Only the requirement line is replaced, leaving the rest of the headers and the description byte-identical.
+    """
+    requirement = WHEEL_AXLE_REQUIRE_LIBPYTHON_DEPENDENCY if require_libpython else WHEEL_AXLE_DEPENDENCY
+    data, count = WHEEL_AXLE_RUNTIME_REQUIREMENT.subn(f"Requires-Dist: {requirement}".encode("utf-8"), data, count=1)
+    if not count:
+        raise DistutilsFileError("the METADATA does not require wheel-axle-runtime, not an axle")
+    return data
+
+
+def repack_wheel(wheel_file, dest_dir=None, python_tag=None, abi_tag=None, root_is_pure=None, require_libpython=None):
+    """Repacks the axle `wheel_file` with new tags, purity or `require-libpython` marker and returns its path.
+
+    The members are copied with their compressed data as is, and only WHEEL, METADATA, RECORD, the markers and the
+    location of the `.pth` file are rewritten. The repacked axle replaces `wheel_file` unless `dest_dir` is given.
+    Options left as None keep their value in `wheel_file`.
+    """
+    name, tag = get_repacked_name(wheel_file, python_tag, abi_tag)
+    dest_file = os.path.join(dest_dir if dest_dir is not None else os.path.dirname(wheel_file), name)
+    tmp_file = dest_file + ".repack"
+    if dest_dir is not None:
+        os.makedirs(dest_dir, exist_ok=True)
+
+    with zipfile.ZipFile(wheel_file) as src:
+        infos = src.infolist()
+        distinfo_dirs = {info.filename.split("/", 1)[0] for info in infos
+                         if info.filename.split("/", 1)[0].endswith(".dist-info") and "/" in info.filename}
+        if len(distinfo_dirs) != 1:
+            raise DistutilsFileError(f"{wheel_file!r} has {len(distinfo_dirs)} .dist-info directories, expected 1")
+        distinfo_dir = distinfo_dirs.pop()
+        dist_name = distinfo_dir[:-len(".dist-info")]
+        wheelfile_path = f"{distinfo_dir}/WHEEL"
+        metadata_path = f"{distinfo_dir}/METADATA"
+        record_path = f"{distinfo_dir}/RECORD"
+        lock_path = f"{distinfo_dir}/{AXLE_LOCK_FILE}"
+        libpython_path = f"{distinfo_dir}/{REQUIRE_LIBPYTHON_FILE}"
+        if lock_path not in src.NameToInfo:
+            raise DistutilsFileError(f"{wheel_file!r} has no {AXLE_LOCK_FILE}, not an axle")
+
+        record = {row[0]: row for row in csv.reader(io.StringIO(src.read(record_path).decode("utf-8"))) if row}
+        wheelfile = BytesHeaderParser().parsebytes(src.read(wheelfile_path))
+        was_pure = wheelfile.get("Root-Is-Purelib", "").strip().lower() == "true"
+        is_pure = was_pure if root_is_pure is None else bool(root_is_pure)
+        if require_libpython is None:
+            require_libpython = libpython_path in src.NameToInfo
+
+        # The `.pth` file lives at the root of a pure wheel and in the purelib of the others
+        pth_paths = {True: f"{dist_name}.pth", False: f"{dist_name}.data/purelib/{dist_name}.pth"}
+        renamed = {pth_paths[was_pure]: pth_paths[is_pure]}
+        rewritten = {wheelfile_path: rewrite_wheelfile(src.read(wheelfile_path), tag, root_is_pure),
+                     metadata_path: rewrite_metadata(src.read(metadata_path), require_libpython)}
+        content_index_path = f"{distinfo_dir}/{CONTENT_INDEX_FILE}"
+        if content_index_path in src.NameToInfo and pth_paths[was_pure] != pth_paths[is_pure]:
+            index = json.loads(src.read(content_index_path))
+            if pth_paths[was_pure] in index["members"]:
+                index["members"][pth_paths[is_pure]] = index["members"].pop(pth_paths[was_pure])
+            rewritten[content_index_path] = json.dumps(index, indent=1, sort_keys=True).encode("utf-8")
+
+        # (member, name in the repacked wheel, rewritten contents or None to copy it as is) in the original order
+        members = []
+        for info in infos:
+            if info.filename == libpython_path:
+                continue
+            members.append((info, renamed.get(info.filename, info.filename), rewritten.get(info.filename)))
+            if info.filename == lock_path and require_libpython:
+                members.append((info, libpython_path, b""))
+
+        new_record = {}
+        for info, filename, data in members:
+            if data is not None:
+                new_record[filename] = [filename, _record_hash(data), str(len(data))]
+            elif info.filename in record and info.filename != record_path:
+                new_record[filename] = [filename] + record[info.filename][1:]
+        # Keeping the original order of the RECORD, the new entries last
+        order = [renamed.get(path, path) for path in record]
+        rows = [new_record.pop(path) for path in order if path in new_record]
+        rows.extend(new_record.values())
+        rows.append([record_path, "", ""])
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerows(rows)
+        rewritten[record_path] = buf.getvalue().encode("utf-8")
+
+        copied = 0
+        with open(wheel_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                zipfile.ZipFile(tmp_file, "w", allowZip64=True) as dst:
+            for info, filename, data in members:
+                if filename == record_path:
+                    data = rewritten[record_path]
+                if data is None:
+                    copy_raw_member(mm, info, dst, filename)
+                    copied += 1
+                    continue
+                zinfo = zipfile.ZipInfo(filename, info.date_time)
+                zinfo.external_attr = info.external_attr
+                zinfo.create_system = info.create_system
+                dst.writestr(zinfo, data, info.compress_type)
+
+    os.replace(tmp_file, dest_file)
+    if dest_dir is None and os.path.abspath(dest_file) != os.path.abspath(wheel_file):
+        os.unlink(wheel_file)
+    log.info("repacked %s as %s, copying %d of %d member(s) as is", wheel_file, dest_file, copied, len(members))
+    return dest_file
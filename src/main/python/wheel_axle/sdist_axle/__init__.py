@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import tarfile
+from distutils import log
+from distutils.archive_util import _get_gid, _get_uid
+from distutils.dir_util import remove_tree
+
+from setuptools.command.sdist import sdist
+
+from wheel_axle.bdist_axle import BuildPy, EggInfo
+from wheel_axle.bdist_axle._file_utils import copy_link
+from wheel_axle.sdist_axle._parallel_gzip import DEFAULT_BLOCK_SIZE, ParallelGzipFile
+
+
+class SdistAxle(sdist):
+    user_options = list(sdist.user_options)
+    user_options += [("jobs=", "j",
+                      "number of parallel compression jobs "
+                      "(default: number of CPUs)"),
+                     ("gzip-block-size=", None,
+                      f"size of the blocks compressed in parallel (default: {DEFAULT_BLOCK_SIZE})"),
+                     ]
+
+    def initialize_options(self):
+        super().initialize_options()
+        self.jobs = None
+        self.gzip_block_size = None
+
+    def finalize_options(self):
+        super().finalize_options()
+        self.jobs = int(self.jobs) if self.jobs else (os.cpu_count() or 1)
+        self.gzip_block_size = int(self.gzip_block_size) if self.gzip_block_size else DEFAULT_BLOCK_SIZE
+
+    def run(self):
+        def remove_patched_command_objs():
+            for k in patch_classes:
+                if k in self.distribution.command_obj:
+                    del self.distribution.command_obj[k]
+
+        # The symlink-aware manifest keeps the symlinks among the package data and sources
+        patch_classes = {"egg_info": EggInfo,
+                         "build_py": BuildPy}
+
+        old_cmdclass = self.distribution.cmdclass
+        self.distribution.cmdclass = dict(old_cmdclass, **patch_classes)
+        remove_patched_command_objs()
+        try:
+            super().run()
+        finally:
+            self.distribution.cmdclass = old_cmdclass
+            remove_patched_command_objs()
+
+    def find_symlink(self, path):
+        """Returns `path` or its closest parent directory that is a symlink, None if there is none"""
+        parts = os.path.normpath(path).split(os.path.sep)
+        for idx in range(1, len(parts) + 1):
+            candidate = os.path.join(*parts[:idx])
+            if os.path.islink(candidate):
+                return candidate
+        return None
+
+    def make_release_tree(self, base_dir, files):
+        """Creates the release tree reproducing the symlinks in `files` instead of copying their targets.
+
+        A file inside a symlinked directory is shipped through the reproduced directory symlink.
+        """
+        regular_files = []
+        symlinks = {}
+        for file in files:
+            symlink = self.find_symlink(file)
+            if symlink is None:
+                regular_files.append(file)
+            else:
+                symlinks[symlink] = None
+
+        super().make_release_tree(base_dir, regular_files)
+
+        for symlink in symlinks:
+            dest = os.path.join(base_dir, symlink)
+            self.mkpath(os.path.dirname(dest))
+            # Left over from a kept release tree
+            if os.path.islink(dest) or os.path.isfile(dest):
+                os.unlink(dest)
+            elif os.path.isdir(dest):
+                remove_tree(dest, dry_run=self.dry_run)
+            copy_link(symlink, dest, verbose=self.verbose, dry_run=self.dry_run, reproduce_link=True)
+
+    def make_archive(self, base_name, format, root_dir=None, base_dir=None, owner=None, group=None):
+        if format != "gztar":
+            return super().make_archive(base_name, format, root_dir=root_dir, base_dir=base_dir, owner=owner,
+                                        group=group)
+        return self.make_tarball(base_name, root_dir, base_dir or os.curdir, owner, group)
+
+    def make_tarball(self, base_name, root_dir, base_dir, owner=None, group=None):
+        """Writes a `.tar.gz` of `base_dir` storing symlinks as link entries, gzipped in parallel"""
+        archive_name = base_name + ".tar.gz"
+        self.mkpath(os.path.dirname(archive_name))
+
+        uid = _get_uid(owner)
+        gid = _get_gid(group)
+
+        def _set_uid_gid(tarinfo):
+            if gid is not None:
+                tarinfo.gid = gid
+                tarinfo.gname = group
+            if uid is not None:
+                tarinfo.uid = uid
+                tarinfo.uname = owner
+            return tarinfo
+
+        log.info("creating %s using %d compression job(s)", archive_name, self.jobs)
+        if not self.dry_run:
+            with ParallelGzipFile(archive_name, jobs=self.jobs, block_size=self.gzip_block_size) as gz:
+                with tarfile.open(fileobj=gz, mode="w|") as tar:
+                    tar.add(os.path.join(root_dir, base_dir) if root_dir else base_dir, arcname=base_dir,
+                            filter=_set_uid_gid)
+        return archive_name
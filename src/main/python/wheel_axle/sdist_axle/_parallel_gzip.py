@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+# Back-references reach at most this far, so it is all of the previous block a compressor needs as a dictionary
+WINDOW_SIZE = 32 * 1024
+
+GZIP_MAGIC = b"\x1f\x8b"
+GZIP_FNAME = 0x08
+GZIP_OS_UNKNOWN = 255
+
+
+def _deflate_block(block, zdict, level, last):
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL,
+                                      zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    # A sync flush ends the block on a byte boundary without marking it final, so the blocks concatenate
+    # into a single deflate stream
+    return compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class ParallelGzipFile:
+    """A write-only gzip file compressing blocks of `block_size` bytes in `jobs` threads.
+
+    Each block is deflated independently, primed with the tail of the previous block as a dictionary, and the
+    results are written in order as one deflate stream, so the output is a standard single-member gzip file.
+    `zlib` releases the GIL while compressing, which is what makes the threads run in parallel.
+    """
+
+    def __init__(self, filename, level=9, jobs=None, block_size=DEFAULT_BLOCK_SIZE, mtime=None):
+        self.name = filename
+        self._level = level
+        self._jobs = jobs or os.cpu_count() or 1
+        self._block_size = block_size
+        self._fileobj = open(filename, "wb")
+        self._executor = ThreadPoolExecutor(max_workers=self._jobs)
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._zdict = b""
+        self._crc = 0
+        self._size = 0
+        self._closed = False
+
+        try:
+            self._write_header(mtime)
+        except BaseException:
+            self._abort()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._abort()
+
+    def _write_header(self, mtime):
+        name = os.path.basename(self.name)
+        if name.endswith(".gz"):
+            name = name[:-3]
+        mtime = int(time.time() if mtime is None else mtime)
+        self._fileobj.write(GZIP_MAGIC + struct.pack("<BBIBB", zlib.DEFLATED, GZIP_FNAME, mtime,
+                                                     2 if self._level == 9 else 0, GZIP_OS_UNKNOWN))
+        self._fileobj.write(name.encode("latin-1", errors="replace") + b"\0")
+
+    def _submit(self, block, last):
+        self._crc = zlib.crc32(block, self._crc)
+        self._size += len(block)
+        self._pending.append(self._executor.submit(_deflate_block, block, self._zdict, self._level, last))
+        self._zdict = block[-WINDOW_SIZE:]
+
+        # Bound the memory held by the compressed blocks waiting for their predecessors
+        while len(self._pending) > 2 * self._jobs:
+            self._fileobj.write(self._pending.popleft().result())
+
+    def write(self, data):
+        if self._closed:
+            raise ValueError("write to closed file")
+        self._buffer += data
+        while len(self._buffer) >= self._block_size:
+            self._submit(bytes(self._buffer[:self._block_size]), False)
+            del self._buffer[:self._block_size]
+        return len(data)
+
+    def close(self):
+        if self._closed:
+            return
+        try:
+            self._submit(bytes(self._buffer), True)
+            self._buffer.clear()
+            while self._pending:
+                self._fileobj.write(self._pending.popleft().result())
+            self._fileobj.write(struct.pack("<II", self._crc, self._size & 0xFFFFFFFF))
+        finally:
+            self._closed = True
+            self._executor.shutdown()
+            self._fileobj.close()
+
+    def _abort(self):
+        self._closed = True
+        for future in self._pending:
+            future.cancel()
+        self._executor.shutdown()
+        self._fileobj.close()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import os
+from distutils import log
+from distutils.cmd import Command
+from distutils.errors import DistutilsError, DistutilsOptionError
+from glob import glob
+
+from wheel_axle.verify_axle._verifier import find_companions, is_axle, verify_wheel
+
+__all__ = ["VerifyAxle", "find_companions", "is_axle", "verify_wheel", "verify_wheels"]
+
+
+def verify_wheels(wheel_files, allowed_external=(), jobs=None):
+    """Verifies the axles `wheel_files` and returns the report of all of them.
+
+    Each axle is verified along with its companion data wheels among `wheel_files`, see `find_companions`.
+    """
+    companions = find_companions(wheel_files)
+    reports = [verify_wheel(wheel_file, allowed_external, jobs, companions[wheel_file]) for wheel_file in wheel_files]
+    return {"ok": all(report["ok"] for report in reports), "wheels": reports}
+
+
+class VerifyAxle(Command):
+    description = "verify the RECORD hashes, symlinks and runtime markers of built axles"
+
+    user_options = [("dist-dir=", "d",
+                     "directory holding the axles to verify (default: dist)"),
+                    ("wheels=", None,
+                     "comma-separated axles to verify (default: every axle in the dist-dir)"),
+                    ("allowed-external=", None,
+                     "comma-separated glob patterns of the symlink destinations allowed outside of the axle "
+                     "(default: none)"),
+                    ("jobs=", "j",
+                     "number of parallel hashing jobs (default: number of CPUs)"),
+                    ("report=", None,
+                     "write the JSON report to this file (default: none)"),
+                    ]
+
+    def initialize_options(self):
+        self.dist_dir = None
+        self.wheels = None
+        self.allowed_external = None
+        self.jobs = None
+        self.report = None
+
+    def finalize_options(self):
+        if self.dist_dir is None:
+            self.dist_dir = "dist"
+        self.allowed_external = [pattern.strip() for pattern in (self.allowed_external or "").split(",")
+                                 if pattern.strip()]
+        self.jobs = int(self.jobs) if self.jobs else (os.cpu_count() or 1)
+        if self.wheels:
+            self.wheels = [wheel.strip() for wheel in self.wheels.split(",") if wheel.strip()]
+        else:
+            self.wheels = [wheel for wheel in sorted(glob(os.path.join(self.dist_dir, "*.whl"))) if is_axle(wheel)]
+        if not self.wheels:
+            raise DistutilsOptionError(f"no wheels to verify in {self.dist_dir!r}")
+
+    def run(self):
+        log.info("verifying %d axle(s) using %d hashing job(s)", len(self.wheels), self.jobs)
+        report = verify_wheels(self.wheels, self.allowed_external, self.jobs)
+
+        if self.report:
+            self.mkpath(os.path.dirname(self.report) or os.curdir)
+            with open(self.report, "wt") as f:
+                json.dump(report, f, indent=2)
+
+        for wheel_report in report["wheels"]:
+            for error in wheel_report["errors"]:
+                log.error("%s: %s: %s: %s", wheel_report["wheel"], error["check"], error["path"], error["message"])
+            if wheel_report["ok"]:
+                log.info("%s: %d member(s) and %d symlink(s) verified", wheel_report["wheel"],
+                         wheel_report["members"], wheel_report["symlinks"])
+
+        if not report["ok"]:
+            failed = sum(not wheel_report["ok"] for wheel_report in report["wheels"])
+            raise DistutilsError(f"{failed} axle(s) failed verification")
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import argparse
+import json
+import sys
+
+from wheel_axle.verify_axle import verify_wheels
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="python -m wheel_axle.verify_axle",
+                                     description="Verifies the RECORD hashes, symlinks and runtime markers of axles, "
+                                                 "printing a JSON report and exiting with 1 if any check fails")
+    parser.add_argument("wheels", nargs="+", metavar="WHEEL", help="axle to verify")
+    parser.add_argument("--allowed-external", action="append", default=[], metavar="PATTERN",
+                        help="glob pattern of the symlink destinations allowed outside of the axle, may be repeated")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of parallel hashing jobs")
+    options = parser.parse_args(args)
+
+    report = verify_wheels(options.wheels, options.allowed_external, options.jobs)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+#
+# (C) Copyright 2021 Karellen, Inc. (https://www.karellen.co/)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import base64
+import contextlib
+import csv
+import fnmatch
+import hashlib
+import io
+import mmap
+import os
+import posixpath
+import re
+import struct
+import sysconfig
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesHeaderParser
+
+from wheel_axle.bdist_axle._zip_utils import member_data_offset
+from wheel_axle.runtime.constants import AXLE_DONE_FILE, AXLE_LOCK_FILE, REQUIRE_LIBPYTHON_FILE, SYMLINKS_FILE
+
+CHUNK_SIZE = 1024 * 1024
+MAX_SYMLINK_DEPTH = 40
+
+WHEEL_AXLE_RUNTIME = "wheel-axle-runtime"
+# Runtimes up to this version do not check for libpython
+REQUIRE_LIBPYTHON_RUNTIME_VERSION = (0, 0, 5)
+
+# Members whose integrity is not recorded in the RECORD
+RECORD_SIGNATURES = ("RECORD", "RECORD.jws", "RECORD.p7s")
+
+# A requirement pinned to a single version, as on the companion data wheels
+PINNED_REQUIREMENT = re.compile(r"^\s*([\w.-]+)\s*===?\s*([^\s;,]+)\s*$")
+
+
+def _error(errors, check, path, message):
+    errors.append({"check": check, "path": path, "message": message})
+
+
+def _hash_member(mm, info):
+    """Returns the SHA-256 digest, size and CRC-32 of the contents of the member `info` read from `mm`"""
+    start = member_data_offset(mm, info)
+
+    if info.compress_type == zipfile.ZIP_STORED:
+        decompress = bytes
+    elif info.compress_type == zipfile.ZIP_DEFLATED:
+        decompress = zlib.decompressobj(-zlib.MAX_WBITS).decompress
+    else:
+        raise zipfile.BadZipFile(f"unsupported compression method {info.compress_type}")
+
+    digest = hashlib.sha256()
+    crc = 0
+    size = 0
+    with memoryview(mm) as view:
+        for offset in range(start, start + info.compress_size, CHUNK_SIZE):
+            with view[offset:min(offset + CHUNK_SIZE, start + info.compress_size)] as chunk:
+                data = decompress(chunk)
+            digest.update(data)
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+    return digest, size, crc
+
+
+def _parse_record(data):
+    record = {}
+    for row in csv.reader(io.StringIO(data.decode("utf-8"))):
+        if row:
+            record[row[0]] = (row[1] if len(row) > 1 else "", row[2] if len(row) > 2 else "")
+    return record
+
+
+def verify_record(wheel_file, zf, distinfo_dir, jobs, errors):
+    """Checks the hash and size of every member against the RECORD, hashing the members in `jobs` threads"""
+    record_path = f"{distinfo_dir}/RECORD"
+    try:
+        record = _parse_record(zf.read(record_path))
+    except KeyError:
+        _error(errors, "record", record_path, "missing")
+        return
+
+    infos = [info for info in zf.infolist() if not info.is_dir()]
+    for info in infos:
+        if info.filename not in record:
+            _error(errors, "record", info.filename, "not listed in the RECORD")
+    names = {info.filename for info in infos}
+    for path in record:
+        if path not in names:
+            _error(errors, "record", path, "listed in the RECORD but missing from the wheel")
+
+    def check(info):
+        try:
+            digest, size, crc = _hash_member(mm, info)
+        except (zipfile.BadZipFile, zlib.error, struct.error) as e:
+            return info.filename, f"unreadable: {e}"
+        if crc != info.CRC:
+            return info.filename, "CRC-32 mismatch"
+        if size != info.file_size:
+            return info.filename, f"size {size} does not match the size {info.file_size} in the archive"
+
+        algorithm_digest, recorded_size = record[info.filename]
+        if not algorithm_digest:
+            return info.filename, None if info.filename == record_path else "no hash in the RECORD"
+        algorithm, _, expected = algorithm_digest.partition("=")
+        if algorithm != "sha256":
+            if algorithm not in hashlib.algorithms_guaranteed:
+                return info.filename, f"unsupported hash algorithm {algorithm!r}"
+            # Not the digest computed in passing, read the member again
+            digest = hashlib.new(algorithm, zf.read(info))
+        if base64.urlsafe_b64encode(digest.digest()).rstrip(b"=").decode("ascii") != expected:
+            return info.filename, "hash does not match the RECORD"
+        if recorded_size and int(recorded_size) != size:
+            return info.filename, f"size {size} does not match the size {recorded_size} in the RECORD"
+        return info.filename, None
+
+    checked = [info for info in infos
+               if info.filename in record and posixpath.basename(info.filename) not in RECORD_SIGNATURES]
+    # The largest first, so that a big member does not end up hashed alone at the end
+    checked.sort(key=lambda info: info.file_size, reverse=True)
+    with open(wheel_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(check, checked))
+    for path, message in sorted(results):
+        if message:
+            _error(errors, "record", path, message)
+
+
+def get_install_paths(dist_name):
+    """Returns the install directories of the schemes relative to the prefix, as the runtime lays the wheel out"""
+    scheme = "nt" if os.name == "nt" else "posix_prefix"
+    variables = {"base": "/", "platbase": "/", "installed_base": "/", "installed_platbase": "/"}
+    paths = sysconfig.get_paths(scheme, variables)
+
+    def relative(path):
+        return posixpath.relpath(path.replace(os.path.sep, "/"), "/")
+
+    return {"purelib": relative(paths["purelib"]),
+            "platlib": relative(paths["platlib"]),
+            "headers": posixpath.join(relative(paths["include"]), dist_name),
+            "scripts": relative(paths["scripts"]),
+            "data": ""}
+
+
+def _read_symlinks(zf, distinfo_dir):
+    try:
+        return list(csv.reader(io.StringIO(zf.read(f"{distinfo_dir}/{SYMLINKS_FILE}").decode("utf-8"))))
+    except KeyError:
+        return None
+
+
+def _get_install_path(distinfo_dir, data_dir, root_scheme):
+    install_paths = get_install_paths(distinfo_dir[:-len(".dist-info")].split("-")[0])
+
+    def install_path(path):
+        if path.startswith(data_dir + "/"):
+            scheme, _, subpath = path[len(data_dir) + 1:].partition("/")
+            if scheme not in install_paths:
+                return None
+            return posixpath.normpath(posixpath.join(install_paths[scheme], subpath))
+        return posixpath.normpath(posixpath.join(install_paths[root_scheme], path))
+
+    return install_path
+
+
+def _add_installed_members(zf, install_path, files, dirs):
+    for info in zf.infolist():
+        path = install_path(info.filename.rstrip("/"))
+        if path is None:
+            continue
+        if info.is_dir():
+            dirs.add(path)
+        else:
+            files[path] = info.filename
+        dirs.update(_parents(path))
+
+
+def verify_symlinks(zf, distinfo_dir, data_dir, root_scheme, allowed_external, errors, companions=()):
+    """Checks that every `symlinks.txt` entry ends up at a member, a directory or an allowed path.
+
+    The members and symlinks of the `companions`, given as `(zf, distinfo_dir, data_dir, root_scheme)`, are installed
+    along with the wheel, so the entries may resolve into them too.
+    """
+    symlinks = _read_symlinks(zf, distinfo_dir)
+    if symlinks is None:
+        return 0
+
+    install_path = _get_install_path(distinfo_dir, data_dir, root_scheme)
+    names = set(zf.namelist())
+    files = {}
+    dirs = set()
+    links = {}
+    _add_installed_members(zf, install_path, files, dirs)
+    for companion_zf, companion_distinfo_dir, companion_data_dir, companion_root_scheme in companions:
+        companion_install_path = _get_install_path(companion_distinfo_dir, companion_data_dir, companion_root_scheme)
+        _add_installed_members(companion_zf, companion_install_path, files, dirs)
+        # Malformed entries are reported by the companion itself
+        for row in _read_symlinks(companion_zf, companion_distinfo_dir) or ():
+            path = companion_install_path(row[0]) if len(row) == 3 and row[2] in ("0", "1") else None
+            if path is not None:
+                links[path] = (row[0], row[1], row[2] == "1")
+                dirs.update(_parents(path))
+
+    own_links = {}
+    for row in symlinks:
+        if len(row) != 3 or row[2] not in ("0", "1"):
+            _error(errors, "symlinks", row[0] if row else "", f"malformed entry {row!r}")
+            continue
+        path = install_path(row[0])
+        if path is None:
+            _error(errors, "symlinks", row[0], "not in an install scheme")
+            continue
+        if row[0] in names:
+            _error(errors, "symlinks", row[0], "clashes with a member of the wheel")
+        own_links[path] = links[path] = (row[0], row[1], row[2] == "1")
+        dirs.update(_parents(path))
+
+    for path, (wheel_path, link_dest, link_dest_isdir) in own_links.items():
+        target = path
+        dest = link_dest
+        for _ in range(MAX_SYMLINK_DEPTH):
+            if posixpath.isabs(dest):
+                target = posixpath.normpath(dest)
+            else:
+                target = posixpath.normpath(posixpath.join(posixpath.dirname(target), dest))
+            if target not in links:
+                break
+            dest = links[target][1]
+        else:
+            _error(errors, "symlinks", wheel_path, f"too many levels of symlinks from {link_dest!r}")
+            continue
+
+        if target in files:
+            if link_dest_isdir:
+                _error(errors, "symlinks", wheel_path, f"{link_dest!r} is marked as a directory but is a file")
+        elif target in dirs:
+            if not link_dest_isdir:
+                _error(errors, "symlinks", wheel_path, f"{link_dest!r} is a directory but not marked as one")
+        elif not any(fnmatch.fnmatchcase(link_dest, pattern) or fnmatch.fnmatchcase(target, pattern)
+                     for pattern in allowed_external):
+            _error(errors, "symlinks", wheel_path, f"{link_dest!r} resolves to {target!r}, which is neither in "
+                                                   f"the wheel nor an allowed external path")
+    return len(symlinks)
+
+
+def _parents(path):
+    path = posixpath.dirname(path)
+    while path and path != "/":
+        yield path
+        path = posixpath.dirname(path)
+
+
+def _version(version):
+    return tuple(int(part) for part in re.findall(r"\d+", version))
+
+
+def verify_markers(zf, distinfo_dir, data_dir, errors):
+    """Checks the files the runtime relies on to finalize the installation of an axle"""
+    names = set(zf.namelist())
+    if f"{distinfo_dir}/{AXLE_LOCK_FILE}" not in names:
+        _error(errors, "markers", f"{distinfo_dir}/{AXLE_LOCK_FILE}", "missing, the symlinks would never be created")
+    if f"{distinfo_dir}/{AXLE_DONE_FILE}" in names:
+        _error(errors, "markers", f"{distinfo_dir}/{AXLE_DONE_FILE}",
+               "shipped in the wheel, the symlinks would never be created")
+
+    pth_name = distinfo_dir[:-len(".dist-info")] + ".pth"
+    pth_paths = [path for path in (pth_name, f"{data_dir}/purelib/{pth_name}", f"{data_dir}/platlib/{pth_name}")
+                 if path in names]
+    if not pth_paths:
+        _error(errors, "markers", pth_name, "missing, the runtime would never be started")
+    elif b"wheel_axle.runtime" not in zf.read(pth_paths[0]):
+        _error(errors, "markers", pth_paths[0], "does not start the runtime")
+
+    try:
+        metadata = BytesHeaderParser().parsebytes(zf.read(f"{distinfo_dir}/METADATA"))
+    except KeyError:
+        _error(errors, "markers", f"{distinfo_dir}/METADATA", "missing")
+        return
+    runtime_requirements = [requirement for requirement in metadata.get_all("Requires-Dist") or ()
+                            if re.match(r"wheel[-_.]axle[-_.]runtime\b", requirement, re.IGNORECASE)]
+    if not runtime_requirements:
+        _error(errors, "markers", f"{distinfo_dir}/METADATA", f"does not require {WHEEL_AXLE_RUNTIME}")
+    elif f"{distinfo_dir}/{REQUIRE_LIBPYTHON_FILE}" in names:
+        lower_bounds = [(operator, _version(version)) for requirement in runtime_requirements
+                        for operator, version in re.findall(r"(>=|>|===?|~=)\s*([\w.]+)", requirement)]
+        if not any(version >= REQUIRE_LIBPYTHON_RUNTIME_VERSION if operator == ">" else
+                   version > REQUIRE_LIBPYTHON_RUNTIME_VERSION for operator, version in lower_bounds):
+            _error(errors, "markers", f"{distinfo_dir}/{REQUIRE_LIBPYTHON_FILE}",
+                   f"requires a {WHEEL_AXLE_RUNTIME} checking for libpython, but the METADATA allows older ones")
+
+
+def _get_distinfo_dirs(zf):
+    return {name.split("/", 1)[0] for name in zf.namelist()
+            if name.split("/", 1)[0].endswith(".dist-info") and "/" in name}
+
+
+def _get_root_scheme(zf, distinfo_dir):
+    wheel = BytesHeaderParser().parsebytes(zf.read(f"{distinfo_dir}/WHEEL"))
+    return "purelib" if wheel.get("Root-Is-Purelib", "").strip().lower() == "true" else "platlib"
+
+
+def _canonical_name(name):
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def read_metadata(wheel_file):
+    """Returns the parsed METADATA of `wheel_file`, None if it cannot be read"""
+    try:
+        with zipfile.ZipFile(wheel_file) as zf:
+            distinfo_dirs = _get_distinfo_dirs(zf)
+            if len(distinfo_dirs) != 1:
+                return None
+            return BytesHeaderParser().parsebytes(zf.read(f"{distinfo_dirs.pop()}/METADATA"))
+    except (OSError, KeyError, zipfile.BadZipFile, zlib.error):
+        return None
+
+
+def is_axle(wheel_file):
+    """Returns whether `wheel_file` is an axle, i.e. requires `wheel-axle-runtime`"""
+    metadata = read_metadata(wheel_file)
+    return metadata is not None and any(re.match(r"wheel[-_.]axle[-_.]runtime\b", requirement, re.IGNORECASE)
+                                        for requirement in metadata.get_all("Requires-Dist") or ())
+
+
+def find_companions(wheel_files):
+    """Returns the `{wheel file: [companion wheel files]}` of `wheel_files`.
+
+    A wheel is grouped with the companion data wheels it pins, `<name>-data` or `<name>-data-<n>` at their exact
+    version, that are among `wheel_files`. The companions of each wheel of a group are the other wheels of the group.
+    """
+    metadatas = {wheel_file: read_metadata(wheel_file) for wheel_file in wheel_files}
+    dists = {(_canonical_name(metadata["Name"] or ""), (metadata["Version"] or "").strip()): wheel_file
+             for wheel_file, metadata in metadatas.items() if metadata is not None}
+
+    companions = {wheel_file: [] for wheel_file in wheel_files}
+    for wheel_file, metadata in metadatas.items():
+        if metadata is None:
+            continue
+        name = _canonical_name(metadata["Name"] or "")
+        group = [wheel_file]
+        for requirement in metadata.get_all("Requires-Dist") or ():
+            match = PINNED_REQUIREMENT.match(requirement)
+            if not match:
+                continue
+            data_name = _canonical_name(match.group(1))
+            if re.fullmatch(re.escape(name) + r"-data(-\d+)?", data_name) and (data_name, match.group(2)) in dists:
+                group.append(dists[data_name, match.group(2)])
+        for member in group:
+            companions[member].extend(other for other in group if other != member and other not in companions[member])
+    return companions
+
+
+def verify_wheel(wheel_file, allowed_external=(), jobs=None, companions=()):
+    """Verifies the axle `wheel_file` and returns the report of the checks.
+
+    The RECORD hashes are checked across `jobs` threads against the memory-mapped wheel, `symlinks.txt` against the
+    members, and the runtime markers against the METADATA. Symlinks resolving outside the wheel are accepted when they
+    end up in one of the `companions` wheel files installed along with it, see `find_companions`, or when their
+    destination, or the path it resolves to relative to the install prefix, matches an `allowed_external` glob.
+    """
+    errors = []
+    report = {"wheel": wheel_file, "ok": False, "members": 0, "symlinks": 0, "errors": errors}
+    try:
+        zf = zipfile.ZipFile(wheel_file)
+    except (OSError, zipfile.BadZipFile) as e:
+        _error(errors, "zip", wheel_file, str(e))
+        return report
+
+    with zf, contextlib.ExitStack() as stack:
+        report["members"] = len(zf.infolist())
+        distinfo_dirs = _get_distinfo_dirs(zf)
+        if len(distinfo_dirs) != 1:
+            _error(errors, "zip", wheel_file, f"expected a single .dist-info directory, found {len(distinfo_dirs)}")
+            return report
+        distinfo_dir = distinfo_dirs.pop()
+        data_dir = distinfo_dir[:-len(".dist-info")] + ".data"
+
+        try:
+            root_scheme = _get_root_scheme(zf, distinfo_dir)
+        except KeyError:
+            _error(errors, "markers", f"{distinfo_dir}/WHEEL", "missing")
+            root_scheme = "purelib"
+
+        # A companion that cannot be read fails its own verification
+        opened_companions = []
+        for companion_file in companions:
+            try:
+                companion_zf = stack.enter_context(zipfile.ZipFile(companion_file))
+                companion_distinfo_dirs = _get_distinfo_dirs(companion_zf)
+                if len(companion_distinfo_dirs) != 1:
+                    continue
+                companion_distinfo_dir = companion_distinfo_dirs.pop()
+                opened_companions.append((companion_zf, companion_distinfo_dir,
+                                          companion_distinfo_dir[:-len(".dist-info")] + ".data",
+                                          _get_root_scheme(companion_zf, companion_distinfo_dir)))
+            except (OSError, KeyError, zipfile.BadZipFile, zlib.error):
+                continue
+
+        verify_record(wheel_file, zf, distinfo_dir, jobs or os.cpu_count() or 1, errors)
+        try:
+            report["symlinks"] = verify_symlinks(zf, distinfo_dir, data_dir, root_scheme, allowed_external, errors,
+                                                 opened_companions)
+            verify_markers(zf, distinfo_dir, data_dir, errors)
+        except (zipfile.BadZipFile, zlib.error) as e:
+            _error(errors, "zip", wheel_file, str(e))
+
+    report["ok"] = not errors
+    return report